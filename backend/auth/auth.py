@@ -1,5 +1,8 @@
+import calendar
 import logging
 import os
+import uuid
+from contextlib import asynccontextmanager
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
@@ -7,7 +10,12 @@ from pydantic import BaseModel
 from db.models.models import User
 from db.schemas_chat.schemas import AuthResponse, UserProfile
 from db.cruds.crud import get_user_by_email, create_user, update_access_token, get_user_by_token, create_stripe_user, get_stripe_user
-from jose import jwt
+from auth.google_certs import GoogleCertCache, GOOGLE_OAUTH2_CERTS_URL
+from auth.token_cache import RevocationList, UserCache
+from services.job_queue import JobQueue
+from services.stripe_client import create_stripe_client
+from db.store import get_async_collection
+from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from bson.objectid import ObjectId
@@ -23,7 +31,56 @@ SECRET_KEY = "2dagK4/1loucS2NJb1k07H8vVQL/D5bBdio0pJmYFWk="
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-auth_router = APIRouter()
+# Usuarios resueltos por token y tokens revocados, para verificar sin ir a la base
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL_SECONDS', '300'))
+AUTH_REVOCATION_COLLECTION = os.getenv('AUTH_REVOCATION_COLLECTION', 'revoked_tokens')
+AUTH_REVOCATION_SYNC_SECONDS = float(os.getenv('AUTH_REVOCATION_SYNC_SECONDS', '10'))
+
+# Certificados de Google en caché; GOOGLE_CERTS_URL permite apuntar a un servidor de llaves local
+GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', "278205127983-fgjv1ctce8is40p6q9d83vqotltj908u.apps.googleusercontent.com")
+google_certs = GoogleCertCache(
+    os.getenv('GOOGLE_CERTS_URL', GOOGLE_OAUTH2_CERTS_URL),
+    refresh_ahead=float(os.getenv('GOOGLE_CERTS_REFRESH_AHEAD_SECONDS', '60'))
+)
+
+user_cache = UserCache(AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL)
+revocation_list = RevocationList(get_async_collection, AUTH_REVOCATION_COLLECTION, AUTH_REVOCATION_SYNC_SECONDS)
+
+async def _provision_stripe_customer(payload: dict):
+    """
+    Trabajo de stripe_jobs: crea el cliente de Stripe del usuario si aún no tiene
+    """
+    user_id = ObjectId(payload["user_id"])
+    if await get_stripe_user(user_id) is not None:
+        return
+
+    stripe_customer = await stripe_client.create_customer(
+        email=payload["email"],
+        name=payload["name"],
+        idempotency_key=f"customer-{payload['user_id']}"
+    )
+    logger.info(f"Stripe customer created: {stripe_customer['id']}")
+    await create_stripe_user(stripe_customer, user_id)
+
+# Cola persistente con reintentos para dar de alta los clientes de Stripe
+stripe_client = create_stripe_client()
+stripe_jobs = JobQueue(
+    get_async_collection,
+    os.getenv('STRIPE_JOBS_COLLECTION', 'stripe_jobs'),
+    handler=_provision_stripe_customer,
+    workers=int(os.getenv('STRIPE_JOBS_WORKERS', '2')),
+    max_attempts=int(os.getenv('STRIPE_JOBS_MAX_ATTEMPTS', '8'))
+)
+
+@asynccontextmanager
+async def _auth_lifespan(app):
+    # Los trabajos que quedaron pendientes de un arranque anterior se retoman sin esperar un login
+    stripe_jobs.start()
+    yield
+    await stripe_jobs.stop()
+
+auth_router = APIRouter(lifespan=_auth_lifespan)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
@@ -32,28 +89,27 @@ class GoogleToken(BaseModel):
 
 async def  create_access_token(user_id: ObjectId, data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
+    # jose interpreta los datetime sin zona como UTC
+    issued_at = datetime.utcnow()
     if expires_delta:
-        expire = datetime.now() + expires_delta
+        expire = issued_at + expires_delta
     else:
-        expire = datetime.now() + timedelta(minutes=30)
+        expire = issued_at + timedelta(minutes=30)
 
-    to_encode.update({"exp": expire})
+    # jti identifica al token en la caché de usuarios y en la lista de revocados
+    jti = uuid.uuid4().hex
+    to_encode.update({"exp": expire, "iat": issued_at, "jti": jti})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
     await update_access_token(user_id, encoded_jwt, expire)
+    await revocation_list.issue(str(user_id), jti, calendar.timegm(expire.utctimetuple()))
     return encoded_jwt
 
 @auth_router.post("/google", response_model=AuthResponse)
 async def login_with_google(google_token: GoogleToken):
     try:
         # Verify the token
-        print("STRIPE KEY FINAL:", os.getenv("STRIPE_SECRET_KEY"))
-
-        idinfo = id_token.verify_oauth2_token(
-            google_token.token, 
-            requests.Request(), 
-            "278205127983-fgjv1ctce8is40p6q9d83vqotltj908u.apps.googleusercontent.com",
-            clock_skew_in_seconds=300)
+        idinfo = await google_certs.verify(google_token.token, GOOGLE_CLIENT_ID, clock_skew_in_seconds=300)
         
         logger.info(f"Token verified: {idinfo}")
 
@@ -72,17 +128,11 @@ async def login_with_google(google_token: GoogleToken):
             user = User(email=email, name=name, user_name=user_name, credits=250, picture=picture)
             await create_user(user)
 
-        stripe_customer = await get_stripe_user(user.id)
-        print(f"Stripe customer: {stripe_customer}")
-        if stripe_customer is None:
-            print(f"Creating new Stripe customer")
-            stripe_customer = stripe.Customer.create( #crea nuevo cliente en stripe, mediante el se guardaran los metodos de pago
-                email=email,
-                name=name
-            )
-
-            print(f"Stripe customer created: {stripe_customer}")
-            await create_stripe_user(stripe_customer, user.id)
+        # El cliente de Stripe se crea en segundo plano; el login no espera al proveedor de pagos
+        await stripe_jobs.enqueue(
+            f"stripe-customer:{user.id}",
+            {"user_id": str(user.id), "email": email, "name": name}
+        )
             
         print(f"User2: {user}")
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -103,10 +153,46 @@ async def login_with_google(google_token: GoogleToken):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 async def verify_access_token(token: str = Depends(oauth2_scheme)):
+    """
+    Verifica firma y exp del JWT en el proceso; la base solo se consulta la primera
+    vez que se ve cada token (para confirmar que es el vigente del usuario)
+    """
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        logger.info(f"Invalid access token: {e}")
+        return {"error": True, "message": "Invalid access token", "status": 401}
+
+    jti = claims.get("jti")
+    if jti is not None:
+        if revocation_list.is_revoked(jti):
+            user_cache.discard(jti)
+            return {"error": True, "message": "Invalid access token", "status": 401}
+        user = user_cache.get(jti)
+        if user is not None:
+            return {"error": False, "user": user, "status": 200}
+
+    # Tokens emitidos antes de agregar jti siguen validándose contra la base
     user = await get_user_by_token(token)
 
     if not user:
         print(f"Invalid access token")
         return {"error": True, "message": "Invalid access token", "status": 401}
 
-    return {"error": False, "user": user, "status": 200}
\ No newline at end of file
+    if jti is not None:
+        user_cache.put(jti, user, claims["exp"])
+        revocation_list.remember(str(claims.get("sub")), jti, claims["exp"])
+
+    return {"error": False, "user": user, "status": 200}
+
+@auth_router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme)):
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+
+    if claims.get("jti") is not None:
+        user_cache.discard(claims["jti"])
+        await revocation_list.revoke(claims["jti"], claims["exp"])
+    return {"success": True}
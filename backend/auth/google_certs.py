@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+import requests
+from google.auth import jwt as google_jwt
+
+logger = logging.getLogger(__name__)
+
+# Mismo endpoint que usa google.oauth2.id_token.verify_oauth2_token
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+
+
+def parse_max_age(cache_control: Optional[str]) -> Optional[int]:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else None
+
+
+class GoogleCertCache:
+    """
+    Caché de los certificados públicos con que Google firma los ID tokens.
+
+    Los certificados se guardan el tiempo que indica el Cache-Control (max-age)
+    de la respuesta y se renuevan en segundo plano refresh_ahead segundos antes
+    de vencer, así que un login solo espera la descarga cuando aún no hay
+    certificados. La verificación de la firma corre en un hilo, fuera del event loop.
+    """
+
+    def __init__(self, certs_url: str = GOOGLE_OAUTH2_CERTS_URL, default_max_age: int = 300,
+                 refresh_ahead: float = 60.0, fetch_timeout: float = 5.0, min_refetch_interval: float = 30.0,
+                 retry_interval: float = 10.0):
+        self.certs_url = certs_url
+        self.default_max_age = default_max_age
+        self.refresh_ahead = refresh_ahead
+        self.fetch_timeout = fetch_timeout
+        self.min_refetch_interval = min_refetch_interval
+        self.retry_interval = retry_interval
+        self.fetches = 0
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    def _fetch(self):
+        response = requests.get(self.certs_url, timeout=self.fetch_timeout)
+        response.raise_for_status()
+        max_age = parse_max_age(response.headers.get("Cache-Control"))
+        return response.json(), max_age if max_age is not None else self.default_max_age
+
+    async def _refresh_locked(self):
+        certs, max_age = await asyncio.to_thread(self._fetch)
+        self.fetches += 1
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max_age
+
+    async def refresh(self):
+        async with self._lock:
+            await self._refresh_locked()
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"No se pudieron renovar los certificados de Google: {e}")
+
+    async def get_certs(self) -> Dict[str, str]:
+        remaining = self._expires_at - time.monotonic()
+        if remaining <= 0:
+            # Sin certificados vigentes hay que esperar; con el lock se descargan una sola vez
+            async with self._lock:
+                if self._expires_at - time.monotonic() <= 0:
+                    try:
+                        await self._refresh_locked()
+                    except Exception as e:
+                        if not self._certs:
+                            raise
+                        # Mejor verificar con la copia vieja que tumbar los logins; se reintenta pronto
+                        logger.warning(f"No se pudieron renovar los certificados de Google, se usan los anteriores: {e}")
+                        self._expires_at = time.monotonic() + self.retry_interval
+        elif remaining < self.refresh_ahead and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_quietly())
+        return self._certs
+
+    async def verify(self, token: str, audience: Optional[str] = None, clock_skew_in_seconds: int = 0) -> dict:
+        """
+        Verifica firma, audiencia y vigencia del ID token; lanza ValueError si no es válido
+        """
+        certs = await self.get_certs()
+        key_id = google_jwt.decode_header(token).get("kid")
+        if key_id is not None and key_id not in certs and time.monotonic() - self._fetched_at > self.min_refetch_interval:
+            # Google rotó sus llaves antes de que venciera nuestra copia
+            async with self._lock:
+                if key_id not in self._certs:
+                    await self._refresh_locked()
+            certs = self._certs
+
+        return await asyncio.to_thread(
+            google_jwt.decode, token, certs=certs, audience=audience, clock_skew_in_seconds=clock_skew_in_seconds
+        )
@@ -0,0 +1,147 @@
+import asyncio
+import calendar
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Caché LRU de usuarios ya resueltos, con llave en el jti del token.
+
+    Cada entrada vence con el token o a los ttl segundos, lo que pase primero,
+    para que los datos del usuario no queden viejos indefinidamente.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, jti: str):
+        entry = self._entries.get(jti)
+        if entry is None or entry[1] < time.time():
+            if entry is not None:
+                del self._entries[jti]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(jti)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, jti: str, user: Any, exp: float):
+        if self.max_size <= 0:
+            return
+        self._entries[jti] = (user, min(exp, time.time() + self.ttl))
+        self._entries.move_to_end(jti)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, jti: str):
+        self._entries.pop(jti, None)
+
+
+class RevocationList:
+    """
+    Tokens revocados antes de su exp, guardados en Mongo ({jti, exp, revoked_at})
+    y copiados en memoria. is_revoked nunca hace I/O: si la copia tiene más de
+    sync_interval segundos lanza una sincronización en segundo plano.
+
+    También recuerda el jti vigente de cada usuario; al emitir un token nuevo el
+    anterior se revoca, igual que cuando la base solo guardaba el último token.
+    """
+
+    def __init__(self, collection_getter, collection_name: str, sync_interval: float = 10.0):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+        self.sync_interval = sync_interval
+        self._revoked: Dict[str, float] = {}
+        self._current: Dict[str, tuple] = {}
+        self._last_sync: Optional[datetime] = None
+        self._synced_at = 0.0
+        self._sync_task = None
+        self._indexes_ready = False
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    def is_revoked(self, jti: str) -> bool:
+        self._maybe_sync()
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+    def remember(self, user_id: str, jti: str, exp: float):
+        self._current.setdefault(user_id, (jti, exp))
+
+    async def issue(self, user_id: str, jti: str, exp: float):
+        """
+        Registra el token nuevo del usuario y revoca el anterior, si se conoce
+        """
+        previous = self._current.get(user_id)
+        self._current[user_id] = (jti, exp)
+        if previous is not None and previous[0] != jti:
+            await self.revoke(*previous)
+
+    async def revoke(self, jti: str, exp: float):
+        self._revoked[jti] = exp
+        try:
+            await self._ensure_indexes()
+            await self.collection.update_one(
+                {"_id": jti},
+                {"$set": {"exp": datetime.utcfromtimestamp(exp), "revoked_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            # Queda revocado en este proceso; los demás lo verán cuando se reintente
+            logger.warning(f"No se pudo guardar la revocación del token: {e}")
+
+    async def sync(self):
+        """
+        Trae las revocaciones nuevas desde la última sincronización y olvida las vencidas
+        """
+        query: Dict[str, Any] = {"exp": {"$gt": datetime.utcnow()}}
+        if self._last_sync is not None:
+            query["revoked_at"] = {"$gte": self._last_sync}
+        started = datetime.utcnow()
+
+        async for doc in self.collection.find(query, {"exp": 1}):
+            self._revoked[doc["_id"]] = calendar.timegm(doc["exp"].utctimetuple())
+        self._last_sync = started
+
+        now = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._current = {user_id: entry for user_id, entry in self._current.items() if entry[1] > now}
+
+    def _maybe_sync(self):
+        if time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if self._sync_task is not None and not self._sync_task.done():
+            return
+        self._synced_at = time.monotonic()
+        try:
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_quietly())
+        except RuntimeError:
+            self._sync_task = None
+
+    async def _sync_quietly(self):
+        try:
+            await self.sync()
+        except Exception as e:
+            logger.warning(f"No se pudo sincronizar la lista de tokens revocados: {e}")
+
+    async def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        # Mongo borra las revocaciones cuando el token ya venció por sí solo
+        await self.collection.create_index([("exp", ASCENDING)], name="exp", expireAfterSeconds=0)
+        await self.collection.create_index([("revoked_at", ASCENDING)], name="revoked_at")
+        self._indexes_ready = True
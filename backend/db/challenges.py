@@ -0,0 +1,165 @@
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db.store import get_async_collection
+
+# Lo que regresan las actualizaciones de progreso: el estado del reto y lo que necesitan los rollups
+PROGRESS_PROJECTION = {
+    "challenge_completed": 1,
+    "progress_totals": 1,
+    "progress_ratio": 1,
+    "previous_progress_ratio": 1,
+    "previous_completed": 1,
+    "cluster_id": 1,
+    "challenge.producto_objetivo": 1,
+    "timestamp": 1
+}
+
+
+class ChallengeRepository:
+    """
+    Acceso asíncrono a los documentos de retos de una colección.
+
+    Con write_behind los inserts se encolan en el buffer; las lecturas y
+    actualizaciones de un reto aún pendiente lo ven igual que si ya estuviera en Mongo.
+    """
+
+    def __init__(self, collection_name: str, collection_getter=get_async_collection, write_behind=None):
+        self.collection_name = collection_name
+        self._collection_getter = collection_getter
+        self.write_behind = write_behind
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    async def insert(self, document: Dict[str, Any]) -> str:
+        if self.write_behind is not None:
+            return await self.write_behind.add(document)
+        result = await self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+    async def get(self, challenge_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        if self.write_behind is not None:
+            pending = self.write_behind.get_pending(ObjectId(challenge_id))
+            if pending is not None:
+                return pending
+        return await self.collection.find_one({"_id": ObjectId(challenge_id)}, projection)
+
+    async def _flush_if_pending(self, challenge_id: str):
+        if self.write_behind is not None and self.write_behind.get_pending(ObjectId(challenge_id)) is not None:
+            await self.write_behind.flush()
+
+    @staticmethod
+    def check_progress_keys(increments: Dict[str, float]):
+        for key in increments:
+            if not key or "." in key or key.startswith("$"):
+                raise ValueError(f"Llave de progreso inválida: {key}")
+
+    @staticmethod
+    def _progress_pipeline(increments: Dict[str, float], timestamp: datetime, count: int = 1) -> List[Dict[str, Any]]:
+        """
+        Pipeline de actualización que suma los incrementos a progress_totals y
+        marca el reto como completado cuando algún contador alcanza challenge.meta_numerica.
+        
+        progress_ratio es el avance del mejor contador respecto a la meta (0 a 1);
+        previous_progress_ratio y previous_completed guardan los valores antes de
+        esta actualización, para que los rollups sumen solo la diferencia.
+        """
+        totals = {
+            f"progress_totals.{key}": {"$add": [{"$ifNull": [f"$progress_totals.{key}", 0]}, {"$literal": value}]}
+            for key, value in increments.items()
+        }
+        meta = "$challenge.meta_numerica"
+        valid_meta = {"$and": [{"$isNumber": meta}, {"$ne": [meta, 0]}]}
+        total_values = {"$map": {
+            "input": {"$objectToArray": {"$ifNull": ["$progress_totals", {}]}},
+            "as": "total",
+            "in": "$$total.v"
+        }}
+        best_total = {"$reduce": {"input": total_values, "initialValue": 0, "in": {"$max": ["$$value", "$$this"]}}}
+        reached = {"$and": [
+            valid_meta,
+            {"$in": [True, {"$map": {"input": total_values, "as": "value", "in": {"$gte": ["$$value", meta]}}}]}
+        ]}
+        ratio = {"$cond": [
+            {"$and": [valid_meta, {"$gt": [meta, 0]}]},
+            {"$max": [0, {"$min": [1, {"$divide": [best_total, meta]}]}]},
+            0
+        ]}
+
+        return [
+            {"$set": {
+                **totals,
+                "progress_count": {"$add": [{"$ifNull": ["$progress_count", 0]}, count]},
+                "last_progress_at": {"$literal": timestamp},
+                "previous_progress_ratio": {"$ifNull": ["$progress_ratio", 0]},
+                "previous_completed": {"$eq": ["$challenge_completed", True]}
+            }},
+            {"$set": {
+                "challenge_completed": {"$or": ["$previous_completed", reached]},
+                "progress_ratio": ratio
+            }}
+        ]
+
+    async def record_progress(self, challenge_id: str, increments: Dict[str, float], timestamp: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Suma los incrementos a los contadores progress_totals del reto y recalcula
+        challenge_completed en el servidor, en un solo find_one_and_update con
+        pipeline de agregación.
+        
+        El reto se completa cuando algún contador alcanza challenge.meta_numerica;
+        una vez completado se queda así. Regresa PROGRESS_PROJECTION del reto ya
+        actualizado, o None si el reto no existe.
+        """
+        self.check_progress_keys(increments)
+        await self._flush_if_pending(challenge_id)
+
+        return await self.collection.find_one_and_update(
+            {"_id": ObjectId(challenge_id)},
+            self._progress_pipeline(increments, timestamp),
+            projection=PROGRESS_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def record_progress_many(self, updates: Dict[str, Tuple[Dict[str, float], datetime, int]]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Aplica el progreso acumulado de varios retos ({challenge_id: (incrementos,
+        último timestamp, número de eventos)}) en un solo bulk_write, con un UpdateOne
+        por reto. Regresa (documentos, errores): PROGRESS_PROJECTION de los retos
+        actualizados que existen, leído después de la escritura (si otro proceso
+        actualiza el mismo reto en medio, los valores previous_* ya son los de esa
+        otra escritura), y el mensaje de error de cada reto cuyo UpdateOne falló.
+        Con ordered=False un error no detiene a los demás, así que solo esos retos
+        quedan sin aplicar.
+        """
+        if not updates:
+            return {}, {}
+        for increments, _, _ in updates.values():
+            self.check_progress_keys(increments)
+
+        challenge_ids = list(updates)
+        ids = [ObjectId(challenge_id) for challenge_id in challenge_ids]
+        if self.write_behind is not None and any(self.write_behind.get_pending(_id) is not None for _id in ids):
+            await self.write_behind.flush()
+
+        failed: Dict[str, str] = {}
+        try:
+            await self.collection.bulk_write([
+                UpdateOne({"_id": _id}, self._progress_pipeline(increments, timestamp, count))
+                for _id, (increments, timestamp, count) in zip(ids, updates.values())
+            ], ordered=False)
+        except BulkWriteError as e:
+            # index es la posición de la operación en el bulk, igual que en challenge_ids
+            for error in e.details.get("writeErrors", []):
+                failed[challenge_ids[error["index"]]] = error.get("errmsg", str(e))
+
+        applied = [_id for challenge_id, _id in zip(challenge_ids, ids) if challenge_id not in failed]
+        if not applied:
+            return {}, failed
+        cursor = self.collection.find({"_id": {"$in": applied}}, PROGRESS_PROJECTION)
+        return {str(doc["_id"]): doc async for doc in cursor}, failed
@@ -0,0 +1,61 @@
+import logging
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import ConnectionFailure, OperationFailure
+
+from db.store import get_async_collection
+
+logger = logging.getLogger(__name__)
+
+# Códigos de MongoDB cuando ya existe un índice con la misma llave u otro nombre pero distintas opciones
+INDEX_CONFLICT_CODES = (85, 86)
+
+
+def challenge_indexes(ttl_seconds: Optional[int] = None) -> List[IndexModel]:
+    """
+    Índices de las colecciones de retos (user_challenges y la de MONGODB_DB).
+    Con ttl_seconds los retos se borran ese tiempo después de creados.
+    """
+    timestamp_options = {"expireAfterSeconds": ttl_seconds} if ttl_seconds else {}
+    return [
+        IndexModel([("cluster_id", ASCENDING)], name="cluster_id"),
+        IndexModel([("challenge_completed", ASCENDING)], name="challenge_completed"),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp", **timestamp_options),
+        IndexModel([("challenge.fecha_limite", ASCENDING)], name="challenge_fecha_limite"),
+    ]
+
+
+def progress_event_indexes(ttl_seconds: Optional[int] = None) -> List[IndexModel]:
+    """
+    Índices de los buckets de progreso: el upsert busca el bucket abierto del día
+    y las lecturas recorren los buckets del reto del más reciente al más antiguo
+    """
+    last_timestamp_options = {"expireAfterSeconds": ttl_seconds} if ttl_seconds else {}
+    return [
+        IndexModel([("challenge_id", ASCENDING), ("day", ASCENDING), ("count", ASCENDING)], name="challenge_day_count"),
+        IndexModel([("challenge_id", ASCENDING), ("day", DESCENDING), ("last_timestamp", DESCENDING)], name="challenge_recent"),
+        IndexModel([("last_timestamp", ASCENDING)], name="last_timestamp", **last_timestamp_options),
+    ]
+
+
+async def ensure_indexes(spec: Dict[str, List[IndexModel]], collection_getter=get_async_collection):
+    """
+    Crea los índices declarados por colección. create_indexes es idempotente, así
+    que se puede llamar en cada arranque; un índice que ya existe con otras opciones
+    (p. ej. al activar o cambiar el TTL) se reporta y se deja como está.
+    """
+    for collection_name, indexes in spec.items():
+        collection = collection_getter(collection_name)
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await collection.create_indexes([index])
+            except ConnectionFailure as e:
+                logger.warning(f"No se pudieron crear los índices, MongoDB no responde: {e}")
+                return
+            except OperationFailure as e:
+                if e.code in INDEX_CONFLICT_CODES:
+                    logger.warning(f"El índice {collection_name}.{name} ya existe con otras opciones; hay que migrarlo a mano: {e}")
+                else:
+                    logger.warning(f"No se pudo crear el índice {collection_name}.{name}: {e}")
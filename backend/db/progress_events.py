@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+
+# Posición de un evento en el historial: (timestamp, _id del bucket, índice en el bucket).
+# Varios eventos pueden tener el mismo timestamp (Mongo guarda milisegundos), así que
+# se pagina con la llave completa; los eventos del arreglo legacy usan bucket "".
+EventKey = Tuple[datetime, str, int]
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Mongo guarda y regresa fechas UTC sin zona horaria; las fechas con zona se
+    convierten antes de compararlas o de elegir el bucket del día
+    """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(key: EventKey) -> str:
+    timestamp, bucket_id, index = key
+    return f"{timestamp.isoformat()}_{bucket_id}_{index}"
+
+
+def decode_cursor(cursor: str) -> EventKey:
+    """
+    Lanza ValueError si el cursor no tiene el formato de encode_cursor
+    """
+    timestamp, bucket_id, index = cursor.rsplit("_", 2)
+    return datetime.fromisoformat(timestamp), bucket_id, int(index)
+
+
+class ProgressEventStore:
+    """
+    Historial crudo de actualizaciones de progreso, fuera del documento del reto.
+
+    Los eventos se agrupan en buckets de hasta bucket_size eventos por reto y por
+    día ({challenge_id, day, count, events}); cuando un bucket se llena el upsert
+    abre uno nuevo, así ningún documento crece sin límite.
+    """
+
+    def __init__(self, collection_getter, collection_name: str, bucket_size: int = 500):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+        self.bucket_size = bucket_size
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    async def append(self, challenge_id: str, event: Dict[str, Any]):
+        # El día del bucket debe ser el día UTC para que el orden de los días siga al de los timestamps
+        timestamp: datetime = naive_utc(event["timestamp"])
+        event = {**event, "timestamp": timestamp}
+        await self.collection.update_one(
+            {
+                "challenge_id": challenge_id,
+                "day": timestamp.strftime("%Y-%m-%d"),
+                "count": {"$lt": self.bucket_size}
+            },
+            {
+                "$push": {"events": event},
+                "$inc": {"count": 1},
+                "$min": {"first_timestamp": timestamp},
+                "$max": {"last_timestamp": timestamp}
+            },
+            upsert=True
+        )
+
+    async def append_many(self, events_by_challenge: Dict[str, List[Dict[str, Any]]]):
+        """
+        Agrega los eventos de varios retos en un solo bulk_write, un upsert por reto y día.
+        Un bucket casi lleno puede pasarse de bucket_size por los eventos de un lote.
+        """
+        operations = []
+        for challenge_id, events in events_by_challenge.items():
+            by_day: Dict[str, List[Dict[str, Any]]] = {}
+            for event in events:
+                event = {**event, "timestamp": naive_utc(event["timestamp"])}
+                by_day.setdefault(event["timestamp"].strftime("%Y-%m-%d"), []).append(event)
+            for day, day_events in by_day.items():
+                for start in range(0, len(day_events), self.bucket_size):
+                    chunk = day_events[start:start + self.bucket_size]
+                    timestamps = [event["timestamp"] for event in chunk]
+                    operations.append(UpdateOne(
+                        {"challenge_id": challenge_id, "day": day, "count": {"$lt": self.bucket_size}},
+                        {
+                            "$push": {"events": {"$each": chunk}},
+                            "$inc": {"count": len(chunk)},
+                            "$min": {"first_timestamp": min(timestamps)},
+                            "$max": {"last_timestamp": max(timestamps)}
+                        },
+                        upsert=True
+                    ))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def page(self, challenge_id: str, limit: int, since: Optional[datetime] = None,
+                   before: Optional[EventKey] = None) -> Tuple[List[Tuple[EventKey, Dict[str, Any]]], bool]:
+        """
+        Los últimos limit eventos del reto con timestamp > since y llave < before, en
+        orden cronológico y cada uno con su llave, y si quedan eventos más antiguos
+        en ese rango. Solo se leen los buckets que se traslapan con el rango.
+        """
+        if limit <= 0:
+            return [], False
+
+        query: Dict[str, Any] = {"challenge_id": challenge_id}
+        if since is not None:
+            query["last_timestamp"] = {"$gt": since}
+        if before is not None:
+            query["first_timestamp"] = {"$lte": before[0]}
+
+        keyed: List[Tuple[EventKey, Dict[str, Any]]] = []
+        cursor = self.collection.find(
+            query,
+            {"events": 1, "last_timestamp": 1},
+            sort=[("day", DESCENDING), ("last_timestamp", DESCENDING), ("_id", DESCENDING)]
+        )
+        async for bucket in cursor:
+            # Los buckets llegan con last_timestamp descendente: si este es más antiguo
+            # que el evento limit + 1 que ya tenemos, ya no puede aportar a la página
+            if len(keyed) > limit and bucket["last_timestamp"] < keyed[0][0][0]:
+                break
+            bucket_id = str(bucket["_id"])
+            for index, event in enumerate(bucket.get("events", [])):
+                key = (event["timestamp"], bucket_id, index)
+                if (since is None or key[0] > since) and (before is None or key < before):
+                    keyed.append((key, event))
+            keyed.sort(key=lambda item: item[0])
+            keyed = keyed[-(limit + 1):]
+
+        return keyed[-limit:], len(keyed) > limit
+
+    async def recent(self, challenge_id: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Los últimos limit eventos del reto, en orden cronológico
+        """
+        events, _ = await self.page(challenge_id, limit)
+        return [event for _, event in events]
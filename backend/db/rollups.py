@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+
+def rollup_key(cluster_id: int, producto_objetivo: Optional[str], month: str) -> Dict[str, Any]:
+    # El orden de las llaves importa: Mongo compara los _id de tipo documento campo por campo
+    return {"cluster_id": cluster_id, "producto_objetivo": producto_objetivo, "month": month}
+
+
+class ChallengeRollups:
+    """
+    Agregados materializados de retos por cluster_id × producto_objetivo × mes de
+    creación: retos creados, completados, suma de progress_ratio y eventos de progreso.
+
+    /store y los endpoints de progreso los actualizan con $inc, así que leerlos
+    cuesta O(grupos). rebuild() los recalcula desde la colección de retos para
+    corregir cualquier desviación.
+    """
+
+    def __init__(self, collection_getter, collection_name: str):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    def _key(self, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        timestamp = document.get("timestamp")
+        if document.get("cluster_id") is None or not isinstance(timestamp, datetime):
+            return None
+        producto = (document.get("challenge") or {}).get("producto_objetivo")
+        return rollup_key(document["cluster_id"], producto, timestamp.strftime("%Y-%m"))
+
+    async def record_created(self, document: Dict[str, Any]):
+        key = self._key(document)
+        if key is None:
+            return
+        await self.collection.update_one(
+            {"_id": key},
+            {"$inc": {"challenges": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def record_progress(self, updates: Iterable[Dict[str, Any]]):
+        """
+        Suma a los rollups lo que cambió cada reto; cada elemento es el documento
+        que regresa ChallengeRepository.record_progress más "events", el número de
+        eventos aplicados
+        """
+        increments: Dict[tuple, Dict[str, Any]] = {}
+        for doc in updates:
+            key = self._key(doc)
+            if key is None:
+                continue
+            inc = increments.setdefault(tuple(key.values()), {
+                "key": key,
+                "completed": 0,
+                "progress_ratio_sum": 0.0,
+                "progress_events": 0
+            })
+            if doc.get("challenge_completed") and not doc.get("previous_completed"):
+                inc["completed"] += 1
+            inc["progress_ratio_sum"] += doc.get("progress_ratio", 0) - doc.get("previous_progress_ratio", 0)
+            inc["progress_events"] += doc.get("events", 1)
+
+        if not increments:
+            return
+        now = datetime.utcnow()
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": inc.pop("key")},
+                {"$inc": inc, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            for inc in increments.values()
+        ], ordered=False)
+
+    async def report(self, cluster_id: Optional[int] = None, producto_objetivo: Optional[str] = None,
+                     month: Optional[str] = None) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if cluster_id is not None:
+            query["_id.cluster_id"] = cluster_id
+        if producto_objetivo is not None:
+            query["_id.producto_objetivo"] = producto_objetivo
+        if month is not None:
+            query["_id.month"] = month
+
+        groups = []
+        async for doc in self.collection.find(query, sort=[("_id.month", -1), ("_id.cluster_id", 1)]):
+            challenges = doc.get("challenges", 0)
+            groups.append({
+                **doc["_id"],
+                "challenges": challenges,
+                "completed": doc.get("completed", 0),
+                "completion_rate": doc.get("completed", 0) / challenges if challenges else 0.0,
+                "avg_progress": doc.get("progress_ratio_sum", 0.0) / challenges if challenges else 0.0,
+                "progress_events": doc.get("progress_events", 0),
+                "updated_at": doc.get("updated_at")
+            })
+        return groups
+
+    async def rebuild(self, source_collection):
+        """
+        Recalcula todos los rollups con una agregación sobre la colección de retos
+        y reemplaza la colección de rollups con $out
+        """
+        pipeline = [
+            {"$match": {"cluster_id": {"$ne": None}, "timestamp": {"$type": "date"}}},
+            {"$group": {
+                "_id": {
+                    "cluster_id": "$cluster_id",
+                    "producto_objetivo": {"$ifNull": ["$challenge.producto_objetivo", None]},
+                    "month": {"$dateToString": {"format": "%Y-%m", "date": "$timestamp"}}
+                },
+                "challenges": {"$sum": 1},
+                "completed": {"$sum": {"$cond": [{"$eq": ["$challenge_completed", True]}, 1, 0]}},
+                "progress_ratio_sum": {"$sum": {"$ifNull": ["$progress_ratio", 0]}},
+                "progress_events": {"$sum": {"$ifNull": ["$progress_count", 0]}}
+            }},
+            {"$set": {"updated_at": "$$NOW"}},
+            {"$out": self.collection_name}
+        ]
+        async for _ in source_collection.aggregate(pipeline):
+            pass
@@ -0,0 +1,106 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ChallengeStatusCache:
+    """
+    Caché LRU en memoria de las respuestas de GET /challenge/{challenge_id}.
+
+    Cada entrada guarda la respuesta ya serializada y su ETag. El endpoint de
+    progreso invalida la entrada del reto; el TTL acota cuánto tiempo puede verse
+    una respuesta vieja cuando el progreso llega por otro proceso.
+
+    Cada invalidación avanza un contador de generación: un GET toma la generación
+    antes de leer Mongo y put descarta la respuesta si el reto se invalidó
+    después, para no volver a guardar un estado viejo.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[str, Dict[str, Any], float]]" = OrderedDict()
+        self._generation = 0
+        # Generación de la última invalidación por reto; al olvidar una se guarda la mayor
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._forgotten = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, challenge_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Regresa (etag, respuesta) o None si no hay una entrada vigente
+        """
+        entry = self._entries.get(challenge_id)
+        if entry is None or entry[2] < time.monotonic():
+            if entry is not None:
+                del self._entries[challenge_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(challenge_id)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, challenge_id: str, etag: str, payload: Dict[str, Any], generation: Optional[int] = None):
+        """
+        generation es la de antes de leer el reto; si se invalidó después no se guarda
+        """
+        if not self.enabled:
+            return
+        if generation is not None and self._invalidated.get(challenge_id, self._forgotten) > generation:
+            return
+        self._entries[challenge_id] = (etag, payload, time.monotonic() + self.ttl)
+        self._entries.move_to_end(challenge_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, challenge_id: str):
+        self._generation += 1
+        self._invalidated[challenge_id] = self._generation
+        self._invalidated.move_to_end(challenge_id)
+        while len(self._invalidated) > max(self.max_size, 1):
+            _, generation = self._invalidated.popitem(last=False)
+            self._forgotten = max(self._forgotten, generation)
+        if self._entries.pop(challenge_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+def challenge_etag(challenge_id: str, document: Dict[str, Any], variant: str = "") -> str:
+    """
+    ETag basado en la versión del reto: cambia con cada progreso registrado y al
+    completarse. variant distingue vistas parciales (campos, página) del mismo reto.
+    """
+    version = document.get("progress_count", 0)
+    completed = 1 if document.get("challenge_completed") else 0
+    if variant:
+        variant = "-" + hashlib.sha1(variant.encode("utf-8")).hexdigest()[:12]
+    return f'"{challenge_id}-{version}-{completed}{variant}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
@@ -1,10 +1,14 @@
+import logging
 import os
 from pymongo.mongo_client import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Check if URL and TOKEN is loaded
 if not os.getenv('MONGODB_URL'):
     raise ValueError("MONGODB_URL not found. Please check your .env file.")
@@ -13,13 +17,59 @@ if not os.getenv('MONGODB_URL'):
 if not os.getenv('MONGODB_DB'):
     raise ValueError("MONGODB_DB not found. Please check your .env file.")
 
-# Conecta al cliente de MongoDB
-client = MongoClient(os.getenv('MONGODB_URL'))
+# Tamaño del pool de conexiones y tiempos límite del cliente asíncrono
+CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.getenv('MONGODB_MAX_POOL_SIZE', '100')),
+    "minPoolSize": int(os.getenv('MONGODB_MIN_POOL_SIZE', '10')),
+    "maxIdleTimeMS": int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '60000')),
+    "waitQueueTimeoutMS": int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+    "serverSelectionTimeoutMS": int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    "connectTimeoutMS": int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000')),
+    "socketTimeoutMS": int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '10000')),
+}
+
+# El cliente síncrono ya no se usa en la app: sin minPoolSize no mantiene conexiones abiertas
+SYNC_CLIENT_OPTIONS = {key: value for key, value in CLIENT_OPTIONS.items() if key != "minPoolSize"}
 
-# Accede a la base de datos
-db = client[os.getenv('MONGODB_DB')]
+# Clientes; se crean al primer uso y el asíncrono se cierra en el shutdown de la app
+_client = None
+_async_client = None
 
 
 # Exportar la base de datos
 def get_collection(collection_name: str):
-    return db[collection_name]
\ No newline at end of file
+    global _client
+    if _client is None:
+        _client = MongoClient(os.getenv('MONGODB_URL'), **SYNC_CLIENT_OPTIONS)
+    return _client[os.getenv('MONGODB_DB')][collection_name]
+
+def get_async_client() -> AsyncIOMotorClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncIOMotorClient(os.getenv('MONGODB_URL'), **CLIENT_OPTIONS)
+    return _async_client
+
+def get_async_db():
+    return get_async_client()[os.getenv('MONGODB_DB')]
+
+def get_async_collection(collection_name: str):
+    return get_async_db()[collection_name]
+
+async def connect_async():
+    """
+    Abre el pool de conexiones asíncrono al arrancar la app y verifica el servidor
+    """
+    try:
+        await get_async_client().admin.command("ping")
+        logger.info("Conexión a MongoDB establecida")
+    except Exception as e:
+        logger.error(f"No se pudo conectar a MongoDB: {e}")
+
+async def close_async():
+    """
+    Cierra el pool de conexiones asíncrono al apagar la app
+    """
+    global _async_client
+    if _async_client is not None:
+        _async_client.close()
+        _async_client = None
\ No newline at end of file
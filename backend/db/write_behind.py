@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    """
+    Buffer de escritura diferida: los documentos reciben su ObjectId al momento y
+    se insertan en lotes con insert_many(ordered=False), cuando el buffer llega a
+    batch_size o cada flush_interval segundos. Una sola tarea hace los flush; add
+    solo la despierta. Al apagar la app se vacía por completo.
+    """
+
+    def __init__(self, collection_getter, collection_name: str, batch_size: int = 500,
+                 flush_interval: float = 0.2, max_pending: int = 10000):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self._pending: Dict[ObjectId, Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task = None
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    async def add(self, document: Dict[str, Any]) -> str:
+        """
+        Encola el documento y regresa su _id sin esperar a que se inserte
+        """
+        document.setdefault("_id", ObjectId())
+        self._pending[document["_id"]] = document
+
+        if len(self._pending) >= self.max_pending:
+            # Contrapresión: si Mongo no alcanza, la solicitud espera al flush
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            self.start()
+            self._wakeup.set()
+
+        return str(document["_id"])
+
+    def get_pending(self, document_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return self._pending.get(document_id)
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                ids = list(self._pending)[:self.batch_size]
+                batch = [self._pending[_id] for _id in ids]
+                retry = await self._insert_batch(batch)
+                for _id in ids:
+                    if _id not in retry:
+                        self._pending.pop(_id, None)
+                if retry:
+                    # Se reintenta en el siguiente flush para no ciclar contra un Mongo caído
+                    break
+
+    async def _insert_batch(self, batch) -> set:
+        """
+        Inserta el lote; regresa los _id que hay que reintentar
+        """
+        self.batches += 1
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.flushed += len(batch)
+            return set()
+        except BulkWriteError as e:
+            retry = set()
+            for error in e.details.get("writeErrors", []):
+                # Un _id duplicado significa que ese documento ya quedó guardado
+                if error.get("code") != DUPLICATE_KEY:
+                    retry.add(batch[error["index"]]["_id"])
+            self.flushed += len(batch) - len(retry)
+            self.failures += len(retry)
+            if retry:
+                logger.warning(f"{len(retry)} retos no se pudieron insertar, se reintentarán")
+            return retry
+        except Exception as e:
+            self.failures += len(batch)
+            logger.warning(f"Error insertando lote de {len(batch)} retos, se reintentará: {e}")
+            return {document["_id"] for document in batch}
+
+    async def _run(self):
+        while True:
+            # Flush cuando add avisa que hay un lote completo o al vencer el intervalo
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # Se limpia antes del flush para no perder un aviso que llegue mientras tanto
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Error en el flush de retos: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Detiene el flush periódico y vacía lo que quede pendiente
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for _ in range(3):
+            await self.flush()
+            if not self._pending:
+                return
+            await asyncio.sleep(0.5)
+        if self._pending:
+            logger.error(f"Quedaron {len(self._pending)} retos sin guardar al apagar")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval
+        }
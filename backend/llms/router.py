@@ -1,20 +1,76 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
-from db.store import get_collection
-from ml.cyrce_model import predecir_cluster
-from services.gemini_service import gemini_service
 from bson import ObjectId
+from db.challenges import ChallengeRepository
+from db.indexes import challenge_indexes, progress_event_indexes
+from db.progress_events import EventKey, ProgressEventStore, decode_cursor, encode_cursor, naive_utc
+from db.rollups import ChallengeRollups
+from db.status_cache import ChallengeStatusCache, challenge_etag, etag_matches
+from db.store import get_async_collection
+from db.write_behind import WriteBehindBuffer
+from ml.cyrce_model import predecir_cluster_async, predecir_clusters_async, prediction_cache
+from services.gemini_service import gemini_service
+import json
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 COLLECTION = os.getenv('MONGODB_DB')
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '20000'))
+# Inserción diferida por lotes de los retos creados en /store
+WRITE_BEHIND_ENABLED = os.getenv('CHALLENGE_WRITE_BEHIND_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CHALLENGE_WRITE_BEHIND_BATCH_SIZE', '500'))
+WRITE_BEHIND_INTERVAL = float(os.getenv('CHALLENGE_WRITE_BEHIND_INTERVAL_SECONDS', '0.2'))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('CHALLENGE_WRITE_BEHIND_MAX_PENDING', '10000'))
+# Historial crudo de progreso en buckets por reto y día
+PROGRESS_EVENTS_COLLECTION = os.getenv('PROGRESS_EVENTS_COLLECTION', 'challenge_progress_events')
+PROGRESS_BUCKET_SIZE = int(os.getenv('PROGRESS_BUCKET_SIZE', '500'))
+RECENT_PROGRESS_EVENTS = int(os.getenv('RECENT_PROGRESS_EVENTS', '20'))
+MAX_PROGRESS_PAGE = int(os.getenv('MAX_PROGRESS_PAGE', '500'))
+BULK_PROGRESS_BATCH_SIZE = int(os.getenv('BULK_PROGRESS_BATCH_SIZE', '5000'))
+# Agregados por cluster × producto × mes para /analytics/challenges
+CHALLENGE_ROLLUPS_COLLECTION = os.getenv('CHALLENGE_ROLLUPS_COLLECTION', 'challenge_rollups')
+# Días que se conservan los retos y su historial de progreso (0 = para siempre)
+CHALLENGE_TTL_DAYS = int(os.getenv('CHALLENGE_TTL_DAYS', '0'))
+# Caché en memoria de GET /challenge/{challenge_id}
+STATUS_CACHE_SIZE = int(os.getenv('CHALLENGE_STATUS_CACHE_SIZE', '10000'))
+STATUS_CACHE_TTL = float(os.getenv('CHALLENGE_STATUS_CACHE_TTL_SECONDS', '300'))
 
 chat_router = APIRouter()
 
+# /store y GET /challenge usan user_challenges; /challenge/progress la colección MONGODB_DB
+challenge_write_behind = WriteBehindBuffer(
+    get_async_collection,
+    "user_challenges",
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_INTERVAL,
+    max_pending=WRITE_BEHIND_MAX_PENDING
+) if WRITE_BEHIND_ENABLED else None
+challenge_repository = ChallengeRepository("user_challenges", write_behind=challenge_write_behind)
+progress_repository = ChallengeRepository(
+    COLLECTION,
+    write_behind=challenge_write_behind if COLLECTION == "user_challenges" else None
+)
+progress_events = ProgressEventStore(get_async_collection, PROGRESS_EVENTS_COLLECTION, bucket_size=PROGRESS_BUCKET_SIZE)
+challenge_status_cache = ChallengeStatusCache(STATUS_CACHE_SIZE, STATUS_CACHE_TTL)
+challenge_rollups = ChallengeRollups(get_async_collection, CHALLENGE_ROLLUPS_COLLECTION)
+
+# Índices que se aplican al arrancar la app (ver main.lifespan)
+_ttl_seconds = CHALLENGE_TTL_DAYS * 86400 or None
+CHALLENGE_INDEXES = {
+    "user_challenges": challenge_indexes(_ttl_seconds),
+    COLLECTION: challenge_indexes(_ttl_seconds),
+    PROGRESS_EVENTS_COLLECTION: progress_event_indexes(_ttl_seconds)
+}
+
 class UserMetricsData(BaseModel):
     ticket_promedio: float
     frecuencia_compra: float
@@ -29,9 +85,116 @@ class UserMetricsData(BaseModel):
 
 class ChallengeProgress(BaseModel):
     challenge_id: str
-    progress_data: Dict[str, Any]  # Ej: {"leches_vendidas": 12}
+    progress_data: Dict[str, Any]  # Incrementos, ej: {"leches_vendidas": 12}
     timestamp: Optional[datetime] = None
+
+# Campos de GET /challenge/{challenge_id} y los campos del documento que necesita cada uno
+STATUS_FIELDS = {
+    "cluster": ["cluster_id", "cluster_info"],
+    "challenge": ["challenge"],
+    "challenge_completed": [],
+    "progress_totals": ["progress_totals"],
+    "progress_count": [],
+    "progress_updates": [],
+    "created_at": ["timestamp"]
+}
+
+class BatchPredictRequest(BaseModel):
+    stores: List[UserMetricsData]
+    
+# Definir información del cluster basada en el ID
+CLUSTER_DESCRIPTIONS = {
+    0: {
+        "name": "Cluster 0",
+        "description": "Cliente tipo 0",
+        "recommendation": "Recomendación para cluster 0"
+    },
+    1: {
+        "name": "Cluster 1", 
+        "description": "Cliente tipo 1",
+        "recommendation": "Recomendación para cluster 1"
+    },
+    2: {
+        "name": "Cluster 2",
+        "description": "Cliente tipo 2", 
+        "recommendation": "Recomendación para cluster 2"
+    },
+    3: {
+        "name": "Cluster 3",
+        "description": "Cliente tipo 3",
+        "recommendation": "Recomendación para cluster 3"
+    },
+    4: {
+        "name": "Cluster 4",
+        "description": "Cliente tipo 4",
+        "recommendation": "Recomendación para cluster 4"
+    }
+}
+
+async def _predict_store_cluster(data_dict: Dict[str, Any]):
+    """
+    Predice el cluster de la tienda y regresa (cluster_id, cluster_info)
+    """
+    # Predecir cluster usando Cyrce (en el executor de inferencia)
+    cluster_id = await predecir_cluster_async(
+        ticket_promedio=data_dict['ticket_promedio'],
+        frecuencia_compra=data_dict['frecuencia_compra'],
+        variabilidad=data_dict['variabilidad'],
+        recencia=data_dict['recencia'],
+        meses_activo=data_dict['meses_activo'],
+        dist_hospital_m=data_dict['dist_hospital_m'],
+        dist_escuela_m=data_dict['dist_escuela_m'],
+        dist_gimnasio_m=data_dict['dist_gimnasio_m'],
+        dist_oficina_m=data_dict['dist_oficina_m'],
+        categoria_mas_frecuente=data_dict['categoria_mas_frecuente']
+    )
+    
+    # Convert numpy int to Python int for MongoDB compatibility
+    cluster_id = int(cluster_id)
+    
+    return cluster_id, _cluster_info(cluster_id)
+
+def _cluster_info(cluster_id: int) -> Dict[str, Any]:
+    return CLUSTER_DESCRIPTIONS.get(cluster_id, {
+        "name": f"Cluster {cluster_id}",
+        "description": f"Cliente tipo {cluster_id}",
+        "recommendation": f"Recomendación para cluster {cluster_id}"
+    })
+
+def _cluster_payload(cluster_id: int, cluster_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": cluster_id,
+        "name": cluster_info["name"],
+        "description": cluster_info["description"],
+        "recommendation": cluster_info["recommendation"]
+    }
+
+async def _insert_challenge(data_dict: Dict[str, Any], cluster_id: int, cluster_info: Dict[str, Any], challenge: Dict[str, Any]) -> str:
+    """
+    Guarda el reto generado en MongoDB y regresa su id
+    """
+    document = {
+        "user_data": data_dict,
+        "cluster_id": cluster_id,
+        "cluster_info": cluster_info,
+        "challenge": challenge,
+        "timestamp": datetime.utcnow(),
+        "challenge_completed": False,
+        "progress_totals": {},
+        "progress_count": 0
+    }
     
+    challenge_id = await challenge_repository.insert(document)
+    await _record_rollup(challenge_rollups.record_created, document)
+    return challenge_id
+
+async def _record_rollup(method, *args):
+    # Los agregados de analítica no deben tumbar la escritura principal; rebuild los corrige
+    try:
+        await method(*args)
+    except Exception as e:
+        logger.warning(f"Error actualizando los rollups de retos: {e}")
+
 @chat_router.post("/store")
 async def store_user_metrics_and_generate_challenge(data: UserMetricsData):
     try:
@@ -39,161 +202,450 @@ async def store_user_metrics_and_generate_challenge(data: UserMetricsData):
         data_dict = data.model_dump()
         
         # 2. Predecir cluster usando Cyrce
-        cluster_id = predecir_cluster(
-            ticket_promedio=data_dict['ticket_promedio'],
-            frecuencia_compra=data_dict['frecuencia_compra'],
-            variabilidad=data_dict['variabilidad'],
-            recencia=data_dict['recencia'],
-            meses_activo=data_dict['meses_activo'],
-            dist_hospital_m=data_dict['dist_hospital_m'],
-            dist_escuela_m=data_dict['dist_escuela_m'],
-            dist_gimnasio_m=data_dict['dist_gimnasio_m'],
-            dist_oficina_m=data_dict['dist_oficina_m'],
-            categoria_mas_frecuente=data_dict['categoria_mas_frecuente']
-        )
-        
-        # Convert numpy int to Python int for MongoDB compatibility
-        cluster_id = int(cluster_id)
-        
-        # Definir información del cluster basada en el ID
-        cluster_descriptions = {
-            0: {
-                "name": "Cluster 0",
-                "description": "Cliente tipo 0",
-                "recommendation": "Recomendación para cluster 0"
-            },
-            1: {
-                "name": "Cluster 1", 
-                "description": "Cliente tipo 1",
-                "recommendation": "Recomendación para cluster 1"
-            },
-            2: {
-                "name": "Cluster 2",
-                "description": "Cliente tipo 2", 
-                "recommendation": "Recomendación para cluster 2"
-            },
-            3: {
-                "name": "Cluster 3",
-                "description": "Cliente tipo 3",
-                "recommendation": "Recomendación para cluster 3"
-            },
-            4: {
-                "name": "Cluster 4",
-                "description": "Cliente tipo 4",
-                "recommendation": "Recomendación para cluster 4"
-            }
-        }
-        
-        cluster_info = cluster_descriptions.get(cluster_id, {
-            "name": f"Cluster {cluster_id}",
-            "description": f"Cliente tipo {cluster_id}",
-            "recommendation": f"Recomendación para cluster {cluster_id}"
-        })
+        cluster_id, cluster_info = await _predict_store_cluster(data_dict)
         
         # 3. Generar reto usando Gemini
-        challenge = gemini_service.generate_challenge(cluster_info, data_dict)
-        
-        # 4. Preparar documento para MongoDB
-        document = {
-            "user_data": data_dict,
-            "cluster_id": cluster_id,
-            "cluster_info": cluster_info,
-            "challenge": challenge,
-            "timestamp": datetime.utcnow(),
-            "challenge_completed": False,
-            "progress_updates": []
-        }
+        challenge = await gemini_service.generate_challenge_async(cluster_info, data_dict, cluster_id)
         
-        # 5. Insertar en MongoDB
-        collection = get_collection("user_challenges")
-        result = collection.insert_one(document)
+        # 4. Insertar en MongoDB
+        challenge_id = await _insert_challenge(data_dict, cluster_id, cluster_info, challenge)
         
         return {
             "success": True,
             "message": "Datos procesados y reto generado correctamente",
-            "challenge_id": str(result.inserted_id),
-            "cluster": {
-                "id": cluster_id,
-                "name": cluster_info["name"],
-                "description": cluster_info["description"],
-                "recommendation": cluster_info["recommendation"]
-            },
+            "challenge_id": challenge_id,
+            "cluster": _cluster_payload(cluster_id, cluster_info),
             "challenge": challenge
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al procesar datos: {str(e)}")
 
+@chat_router.post("/store/stream")
+async def store_user_metrics_and_stream_challenge(data: UserMetricsData):
+    """
+    Variante de /store que responde en NDJSON: una línea con el cluster en cuanto
+    se predice, otra con el reto cuando está listo y otra con el challenge_id guardado
+    """
+    data_dict = data.model_dump()
+    
+    async def events():
+        try:
+            cluster_id, cluster_info = await _predict_store_cluster(data_dict)
+            yield _ndjson({"event": "cluster", "cluster": _cluster_payload(cluster_id, cluster_info)})
+            
+            challenge = await gemini_service.generate_challenge_async(cluster_info, data_dict, cluster_id)
+            yield _ndjson({"event": "challenge", "challenge": challenge})
+            
+            challenge_id = await _insert_challenge(data_dict, cluster_id, cluster_info, challenge)
+            yield _ndjson({"event": "stored", "success": True, "challenge_id": challenge_id})
+            
+        except Exception as e:
+            yield _ndjson({"event": "error", "success": False, "detail": f"Error al procesar datos: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _ndjson(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+@chat_router.post("/clusters/predict:batch")
+async def predict_clusters_batch(request: BatchPredictRequest):
+    if len(request.stores) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"El lote excede el máximo de {MAX_BATCH_SIZE} tiendas")
+
+    try:
+        # Una sola transformación y predicción para todo el lote
+        clusters = await predecir_clusters_async([store.model_dump() for store in request.stores])
+
+        return {
+            "success": True,
+            "count": len(clusters),
+            "clusters": clusters
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al predecir clusters: {str(e)}")
+
+@chat_router.post("/challenges/generate:batch")
+async def generate_challenges_batch(request: BatchPredictRequest):
+    """
+    Refresco nocturno de campaña: predice el cluster de todas las tiendas en una
+    sola pasada, genera sus retos con prompts de varias tiendas y los guarda
+    """
+    if len(request.stores) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"El lote excede el máximo de {MAX_BATCH_SIZE} tiendas")
+
+    try:
+        stores = [store.model_dump() for store in request.stores]
+        cluster_ids = [int(cluster_id) for cluster_id in await predecir_clusters_async(stores)]
+
+        challenges = await gemini_service.generate_challenges_batch(
+            [(_cluster_info(cluster_id), data_dict) for cluster_id, data_dict in zip(cluster_ids, stores)]
+        )
+
+        results = []
+        for data_dict, cluster_id, challenge in zip(stores, cluster_ids, challenges):
+            cluster_info = _cluster_info(cluster_id)
+            challenge_id = await _insert_challenge(data_dict, cluster_id, cluster_info, challenge)
+            results.append({"challenge_id": challenge_id, "cluster": _cluster_payload(cluster_id, cluster_info)})
+
+        return {
+            "success": True,
+            "count": len(results),
+            "challenges": results
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar retos: {str(e)}")
+
+@chat_router.get("/clusters/cache")
+async def get_prediction_cache_stats():
+    return prediction_cache.stats()
+
+@chat_router.get("/llm/metrics")
+async def get_llm_metrics():
+    return gemini_service.get_metrics()
+
+@chat_router.get("/llm/circuit")
+async def get_llm_circuit_state():
+    return gemini_service.circuit_breaker.snapshot()
+
 @chat_router.post("/challenge/progress")
 async def update_challenge_progress(progress: ChallengeProgress):
     try:
-        collection = get_collection(COLLECTION)
-        
-        # Buscar el documento del reto
-        challenge_doc = collection.find_one({"_id": ObjectId(progress.challenge_id)})
-        if not challenge_doc:
-            raise HTTPException(status_code=404, detail="Reto no encontrado")
-        
         # Preparar actualización de progreso
         progress_update = {
             "data": progress.progress_data,
-            "timestamp": progress.timestamp or datetime.utcnow()
+            "timestamp": naive_utc(progress.timestamp) or datetime.utcnow()
         }
         
-        # Verificar si el reto se completó
-        challenge_completed = False
-        if challenge_doc.get("challenge", {}).get("meta_numerica"):
-            meta_numerica = challenge_doc["challenge"]["meta_numerica"]
-            # producto_objetivo = challenge_doc["challenge"]["producto_objetivo"]
-            
-            # Buscar en progress_data una clave que coincida con el producto
-            for key, value in progress.progress_data.items():
-                if isinstance(value, (int, float)) and value >= meta_numerica:
-                    challenge_completed = True
-                    break
-        
-        # Actualizar documento en MongoDB
-        update_result = collection.update_one(
-            {"_id": ObjectId(progress.challenge_id)},
-            {
-                "$push": {"progress_updates": progress_update},
-                "$set": {"challenge_completed": challenge_completed}
-            }
-        )
+        # Los valores numéricos se acumulan en contadores por producto en el reto
+        increments = {
+            key: value for key, value in progress.progress_data.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        
+        try:
+            updated = await progress_repository.record_progress(
+                progress.challenge_id, increments, progress_update["timestamp"]
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Reto no encontrado")
+        
+        challenge_status_cache.invalidate(progress.challenge_id)
+        await _record_rollup(challenge_rollups.record_progress, [updated])
         
-        if update_result.modified_count == 0:
-            raise HTTPException(status_code=500, detail="No se pudo actualizar el progreso")
+        # El evento crudo va al historial por buckets, no al documento del reto. Los
+        # contadores ya cambiaron, así que un error aquí no debe hacer que el cliente reintente
+        history_saved = True
+        try:
+            await progress_events.append(progress.challenge_id, progress_update)
+        except Exception as e:
+            logger.warning(f"Error guardando el historial de progreso del reto {progress.challenge_id}: {e}")
+            history_saved = False
+        
+        challenge_completed = updated.get("challenge_completed", False)
         
         return {
             "success": True,
             "message": "Progreso actualizado correctamente",
             "challenge_completed": challenge_completed,
-            "progress_data": progress.progress_data
+            "progress_data": progress.progress_data,
+            "progress_totals": updated.get("progress_totals", {}),
+            "history_saved": history_saved
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar progreso: {str(e)}")
 
+async def _ndjson_lines(request: Request):
+    """
+    Líneas del cuerpo NDJSON conforme llegan, sin cargarlo completo en memoria
+    """
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+async def _apply_progress_batch(batch: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Agrupa por reto los eventos del lote y los aplica con un bulk_write por colección
+    """
+    results = {}
+    grouped: Dict[str, List[Any]] = {}
+    for line_no, progress in batch:
+        increments = {
+            key: value for key, value in progress.progress_data.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        try:
+            if not ObjectId.is_valid(progress.challenge_id):
+                raise ValueError(f"challenge_id inválido: {progress.challenge_id}")
+            ChallengeRepository.check_progress_keys(increments)
+        except ValueError as e:
+            results[line_no] = {"line": line_no, "challenge_id": progress.challenge_id, "status": "invalid", "detail": str(e)}
+            continue
+        event = {"data": progress.progress_data, "timestamp": naive_utc(progress.timestamp) or datetime.utcnow()}
+        grouped.setdefault(progress.challenge_id, []).append((line_no, increments, event))
+
+    updates = {}
+    for challenge_id, items in grouped.items():
+        totals: Dict[str, float] = {}
+        for _, increments, _ in items:
+            for key, value in increments.items():
+                totals[key] = totals.get(key, 0) + value
+        updates[challenge_id] = (totals, max(event["timestamp"] for _, _, event in items), len(items))
+
+    try:
+        updated, failed = await progress_repository.record_progress_many(updates)
+    except Exception as e:
+        # No se sabe de ningún reto que se haya aplicado: el cliente puede reintentar
+        for challenge_id, items in grouped.items():
+            for line_no, _, _ in items:
+                results[line_no] = {"line": line_no, "challenge_id": challenge_id, "status": "error", "detail": str(e)}
+        return [results[line_no] for line_no in sorted(results)]
+
+    for challenge_id in updated:
+        challenge_status_cache.invalidate(challenge_id)
+
+    # Los contadores ya se aplicaron; si falla el historial se reporta aparte para que no se reintente
+    history_error = None
+    try:
+        await progress_events.append_many({
+            challenge_id: [event for _, _, event in grouped[challenge_id]] for challenge_id in updated
+        })
+    except Exception as e:
+        logger.warning(f"Error guardando el historial de progreso de {len(updated)} retos: {e}")
+        history_error = str(e)
+    await _record_rollup(challenge_rollups.record_progress, [
+        {**doc, "events": len(grouped[challenge_id])} for challenge_id, doc in updated.items()
+    ])
+
+    for challenge_id, items in grouped.items():
+        doc = updated.get(challenge_id)
+        for line_no, _, _ in items:
+            if challenge_id in failed:
+                results[line_no] = {"line": line_no, "challenge_id": challenge_id, "status": "error", "detail": failed[challenge_id]}
+            elif doc is None:
+                results[line_no] = {"line": line_no, "challenge_id": challenge_id, "status": "not_found"}
+            else:
+                results[line_no] = {
+                    "line": line_no,
+                    "challenge_id": challenge_id,
+                    "status": "ok" if history_error is None else "history_failed",
+                    "challenge_completed": doc.get("challenge_completed", False)
+                }
+                if history_error is not None:
+                    results[line_no]["detail"] = history_error
+    return [results[line_no] for line_no in sorted(results)]
+
+async def _apply_progress_batch_safely(batch: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Un error inesperado en un lote se reporta en sus líneas; los resultados de los
+    lotes anteriores, que ya se escribieron, se siguen regresando
+    """
+    try:
+        return await _apply_progress_batch(batch)
+    except Exception as e:
+        logger.error(f"Error aplicando un lote de {len(batch)} eventos de progreso: {e}")
+        return [
+            {"line": line_no, "challenge_id": progress.challenge_id, "status": "error", "detail": str(e)}
+            for line_no, progress in batch
+        ]
+
+@chat_router.post("/challenge/progress:bulk")
+async def bulk_update_challenge_progress(request: Request):
+    """
+    Recibe eventos de progreso en NDJSON (un ChallengeProgress por línea) de
+    muchos retos. Se procesan por lotes de BULK_PROGRESS_BATCH_SIZE eventos
+    conforme llega el cuerpo; challenge_completed es el estado del reto al
+    terminar su lote.
+
+    Estado por línea: ok; history_failed (el progreso se contó pero el evento
+    no quedó en el historial; no se debe reintentar); error (no se aplicó, se
+    puede reintentar); not_found; invalid.
+    """
+    results: List[Dict[str, Any]] = []
+    batch: List[Any] = []
+    line_no = 0
+    async for line in _ndjson_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            batch.append((line_no, ChallengeProgress(**json.loads(line))))
+        except Exception as e:
+            results.append({"line": line_no, "status": "invalid", "detail": str(e)})
+            continue
+        if len(batch) >= BULK_PROGRESS_BATCH_SIZE:
+            results.extend(await _apply_progress_batch_safely(batch))
+            batch = []
+    if batch:
+        results.extend(await _apply_progress_batch_safely(batch))
+
+    results.sort(key=lambda result: result["line"])
+    applied = sum(1 for result in results if result["status"] in ("ok", "history_failed"))
+    return jsonable_encoder({
+        "received": len(results),
+        "applied": applied,
+        "failed": len(results) - applied,
+        "results": results
+    })
+
+@chat_router.get("/analytics/challenges")
+async def get_challenge_analytics(
+    cluster_id: Optional[int] = None,
+    producto_objetivo: Optional[str] = None,
+    month: Optional[str] = Query(None, description="Mes de creación de los retos, YYYY-MM")
+):
+    """
+    Retos creados, tasa de completado y avance promedio por cluster × producto × mes
+    """
+    try:
+        groups = await challenge_rollups.report(cluster_id, producto_objetivo, month)
+        return jsonable_encoder({"groups": groups})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener analítica de retos: {str(e)}")
+
+@chat_router.post("/analytics/challenges:rebuild")
+async def rebuild_challenge_analytics():
+    try:
+        await challenge_rollups.rebuild(challenge_repository.collection)
+        return {"success": True}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al recalcular analítica de retos: {str(e)}")
+
+@chat_router.get("/challenges/cache")
+async def get_challenge_status_cache_stats():
+    return challenge_status_cache.stats()
+
+def _status_projection(fields: List[str], limit: int, before: Optional[EventKey]) -> Dict[str, Any]:
+    """
+    Proyección de Mongo con solo lo necesario para los campos pedidos
+    """
+    projection: Dict[str, Any] = {
+        "progress_count": 1,
+        "challenge_completed": 1,
+        # Tamaño del arreglo de los retos anteriores a los buckets, sin traerlo completo
+        "legacy_count": {"$size": {"$ifNull": ["$progress_updates", []]}}
+    }
+    for field in fields:
+        for name in STATUS_FIELDS[field]:
+            projection[name] = 1
+    if "progress_updates" in fields:
+        projection["progress_updates"] = 1 if before is not None else {"$slice": -limit}
+    return projection
+
+async def _status_payload(challenge_id: str, challenge_doc: Dict[str, Any], fields: List[str], limit: int,
+                          since: Optional[datetime], before: Optional[EventKey]) -> Dict[str, Any]:
+    legacy_count = challenge_doc.get("legacy_count", len(challenge_doc.get("progress_updates", [])))
+    values = {
+        "cluster": lambda: {"id": challenge_doc["cluster_id"], "info": challenge_doc["cluster_info"]},
+        "challenge": lambda: challenge_doc["challenge"],
+        "challenge_completed": lambda: challenge_doc.get("challenge_completed", False),
+        "progress_totals": lambda: challenge_doc.get("progress_totals", {}),
+        "progress_count": lambda: challenge_doc.get("progress_count", 0) + legacy_count,
+        "created_at": lambda: challenge_doc["timestamp"]
+    }
+    payload = {"challenge_id": challenge_id}
+    for field in fields:
+        if field in values:
+            payload[field] = values[field]()
+
+    if "progress_updates" in fields:
+        events, has_more = await progress_events.page(challenge_id, limit, since=since, before=before)
+        # Los retos anteriores a los buckets aún traen su arreglo progress_updates, más antiguo
+        legacy_updates = challenge_doc.get("progress_updates", [])
+        if legacy_count and not has_more:
+            # Sin cursor la proyección solo trajo los últimos limit del arreglo
+            offset = legacy_count - len(legacy_updates)
+            legacy = [
+                ((event["timestamp"], "", offset + index), event) for index, event in enumerate(legacy_updates)
+            ]
+            legacy = [
+                (key, event) for key, event in legacy
+                if (since is None or key[0] > since) and (before is None or key < before)
+            ]
+            has_more = len(legacy) + len(events) > limit or (before is None and offset > 0)
+            events = sorted(legacy + events, key=lambda item: item[0])[-limit:] if limit else []
+        payload["progress_updates"] = [event for _, event in events]
+        payload["next_cursor"] = encode_cursor(events[0][0]) if has_more and events else None
+
+    return jsonable_encoder(payload)
+
 @chat_router.get("/challenge/{challenge_id}")
-async def get_challenge_status(challenge_id: str):
+async def get_challenge_status(
+    challenge_id: str,
+    fields: Optional[str] = Query(None, description="Campos separados por coma; por defecto todos"),
+    limit: Optional[int] = Query(None, ge=0, le=MAX_PROGRESS_PAGE, description="Cuántas actualizaciones de progreso regresar"),
+    since: Optional[datetime] = Query(None, description="Solo actualizaciones posteriores a esta fecha"),
+    before: Optional[datetime] = Query(None, description="Solo actualizaciones anteriores a esta fecha"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    if_none_match: Optional[str] = Header(None)
+):
     try:
-        collection = get_collection("user_challenges")
+        requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else list(STATUS_FIELDS)
+        unknown = [field for field in requested if field not in STATUS_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(unknown)}")
+        
+        # Solo la vista por defecto pasa por la caché; las demás dependen de los parámetros
+        default_view = fields is None and limit is None and since is None and before is None and cursor is None
+        limit = RECENT_PROGRESS_EVENTS if limit is None else limit
+        since, before = naive_utc(since), naive_utc(before)
+        
+        # Una fecha equivale a la llave más baja de ese instante: excluye los eventos con ese timestamp
+        keys = [] if before is None else [(before, "", -1)]
+        if cursor is not None:
+            try:
+                timestamp, bucket_id, index = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Cursor inválido")
+            keys.append((naive_utc(timestamp), bucket_id, index))
+        before_key = min(keys) if keys else None
         
-        challenge_doc = collection.find_one({"_id": ObjectId(challenge_id)})
+        # Las consultas repetidas se sirven de memoria; con If-None-Match ni siquiera se manda el cuerpo
+        cached = challenge_status_cache.get(challenge_id) if default_view else None
+        if cached is not None:
+            etag, payload = cached
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            return JSONResponse(content=payload, headers={"ETag": etag})
+        
+        variant = "" if default_view else f"{','.join(requested)}|{limit}|{since}|{before}|{cursor}"
+        # Fuera de la caché, con If-None-Match basta leer la versión del reto para responder 304
+        if if_none_match:
+            version_doc = await challenge_repository.get(challenge_id, {"progress_count": 1, "challenge_completed": 1})
+            if not version_doc:
+                raise HTTPException(status_code=404, detail="Reto no encontrado")
+            etag = challenge_etag(challenge_id, version_doc, variant=variant)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+        
+        # Si un progreso invalida el reto mientras se lee, la respuesta no se guarda en la caché
+        generation = challenge_status_cache.generation()
+        challenge_doc = await challenge_repository.get(challenge_id, _status_projection(requested, limit, before_key))
         if not challenge_doc:
             raise HTTPException(status_code=404, detail="Reto no encontrado")
         
-        return {
-            "challenge_id": challenge_id,
-            "cluster": {
-                "id": challenge_doc["cluster_id"],
-                "info": challenge_doc["cluster_info"]
-            },
-            "challenge": challenge_doc["challenge"],
-            "challenge_completed": challenge_doc.get("challenge_completed", False),
-            "progress_updates": challenge_doc.get("progress_updates", []),
-            "created_at": challenge_doc["timestamp"]
-        }
+        payload = await _status_payload(challenge_id, challenge_doc, requested, limit, since, before_key)
+        etag = challenge_etag(challenge_id, challenge_doc, variant=variant)
+        if default_view:
+            challenge_status_cache.put(challenge_id, etag, payload, generation)
+        
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(content=payload, headers={"ETag": etag})
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener estado del reto: {str(e)}")
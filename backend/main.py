@@ -1,8 +1,39 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from llms.router import chat_router
 
-app = FastAPI(docs_url='/docs')
+from db.indexes import ensure_indexes
+from db.store import connect_async, close_async
+from llms.router import chat_router, challenge_write_behind, CHALLENGE_INDEXES, CLUSTER_DESCRIPTIONS
+from services.gemini_service import gemini_service
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_async()
+    await ensure_indexes(CHALLENGE_INDEXES)
+    if gemini_service.challenge_cache.enabled:
+        try:
+            await gemini_service.challenge_cache.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"No se pudieron crear los índices de la caché de retos: {e}")
+    if challenge_write_behind is not None:
+        challenge_write_behind.start()
+    # Worker que mantiene lleno el pool de retos pre-generados
+    await gemini_service.challenge_pool.start(gemini_service, CLUSTER_DESCRIPTIONS)
+    yield
+    await gemini_service.challenge_pool.stop()
+    # Vaciar los retos pendientes antes de cerrar la conexión
+    if challenge_write_behind is not None:
+        await challenge_write_behind.stop()
+    await close_async()
+
+
+app = FastAPI(docs_url='/docs', lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,4 +44,4 @@ app.add_middleware(
 )
 
 
-app.include_router(chat_router, prefix="")
+app.include_router(chat_router, prefix="")
\ No newline at end of file
@@ -0,0 +1,132 @@
+import numpy as np
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+
+class CompiledModel:
+    """
+    Versión compilada del pipeline Cyrce (StandardScaler + OneHotEncoder + KMeans)
+    en arreglos planos de NumPy, para predecir sin pandas ni sklearn.
+    """
+
+    def __init__(self, columnas_numericas, medias, escalas, columna_categorica, categorias, centros):
+        self.columnas_numericas = list(columnas_numericas)
+        self.medias = np.asarray(medias, dtype=np.float64)
+        self.escalas = np.asarray(escalas, dtype=np.float64)
+        self.columna_categorica = columna_categorica
+        self.categorias = list(categorias)
+        self.centros = np.asarray(centros, dtype=np.float64)
+
+        n_num = len(self.columnas_numericas)
+        self._indice_categoria = {categoria: i for i, categoria in enumerate(self.categorias)}
+        self._centros_num = np.ascontiguousarray(self.centros[:, :n_num])
+        self._centros_cat = np.ascontiguousarray(self.centros[:, n_num:])
+        # Norma al cuadrado de la parte categórica de cada centroide
+        self._norma_cat = (self._centros_cat ** 2).sum(axis=1)
+        # Columnas que el modelo recibe en escala log1p ('ticket_promedio_log' <- 'ticket_promedio')
+        self._campos = [columna[:-4] if columna.endswith('_log') else columna for columna in self.columnas_numericas]
+        self._es_log = np.array([columna.endswith('_log') for columna in self.columnas_numericas])
+
+    def _distancias(self, X_num: np.ndarray, indices_categoria: np.ndarray) -> np.ndarray:
+        z = (X_num - self.medias) / self.escalas
+        diff = z[:, None, :] - self._centros_num[None, :, :]
+        distancias = (diff ** 2).sum(axis=2) + self._norma_cat
+        # Un one-hot en la categoría k suma 1 y resta 2 * c_k a la distancia; categorías desconocidas quedan en ceros
+        conocidas = indices_categoria >= 0
+        if conocidas.any():
+            distancias[conocidas] += 1.0 - 2.0 * self._centros_cat[:, indices_categoria[conocidas]].T
+        return distancias
+
+    def _matriz(self, clientes):
+        X_num = np.array([[cliente[campo] for campo in self._campos] for cliente in clientes], dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            X_num[:, self._es_log] = np.log1p(X_num[:, self._es_log])
+        # Con NaN o inf todas las distancias son NaN y argmin daría el cluster 0; sklearn lanza ValueError
+        if not np.isfinite(X_num).all():
+            raise ValueError("Los datos del cliente contienen NaN o infinito")
+        indices = np.array(
+            [self._indice_categoria.get(cliente[self.columna_categorica], -1) for cliente in clientes],
+            dtype=np.int64,
+        )
+        return X_num, indices
+
+    def predecir(self, cliente: dict) -> int:
+        """
+        Predice el cluster de un cliente con los mismos campos que recibe predecir_cluster
+        """
+        X_num, indices = self._matriz([cliente])
+        return int(self._distancias(X_num, indices)[0].argmin())
+
+    def predecir_lote(self, clientes) -> list:
+        """
+        Predice el cluster de una lista de clientes, en el mismo orden
+        """
+        if not clientes:
+            return []
+        X_num, indices = self._matriz(clientes)
+        return self._distancias(X_num, indices).argmin(axis=1).tolist()
+
+    def guardar(self, path: str):
+        """
+        Guarda los arreglos del modelo compilado en un archivo .npz
+        """
+        np.savez(
+            path,
+            columnas_numericas=np.array(self.columnas_numericas),
+            medias=self.medias,
+            escalas=self.escalas,
+            columna_categorica=np.array(self.columna_categorica),
+            categorias=np.array(self.categorias),
+            centros=self.centros,
+        )
+
+    @classmethod
+    def cargar(cls, path: str) -> "CompiledModel":
+        """
+        Carga un modelo compilado guardado con guardar()
+        """
+        with np.load(path, allow_pickle=False) as datos:
+            return cls(
+                columnas_numericas=datos['columnas_numericas'].tolist(),
+                medias=datos['medias'],
+                escalas=datos['escalas'],
+                columna_categorica=str(datos['columna_categorica']),
+                categorias=datos['categorias'].tolist(),
+                centros=datos['centros'],
+            )
+
+
+def exportar_modelo(preprocessor, kmeans) -> CompiledModel:
+    """
+    Extrae medias, escalas, categorías y centroides del pipeline entrenado.
+
+    Lanza ValueError si el pipeline no tiene la forma que sabe compilar
+    (un StandardScaler numérico seguido de un OneHotEncoder de una sola columna).
+    """
+    transformers = [t for t in preprocessor.transformers_ if t[0] != 'remainder']
+    if len(transformers) != 2:
+        raise ValueError("Se esperaban exactamente dos transformadores (num, cat)")
+
+    (_, scaler, columnas_numericas), (_, encoder, columnas_categoricas) = transformers
+
+    if not isinstance(scaler, StandardScaler) or not isinstance(encoder, OneHotEncoder):
+        raise ValueError("El pipeline debe ser StandardScaler + OneHotEncoder")
+    if len(columnas_categoricas) != 1 or encoder.drop is not None or encoder.handle_unknown != 'ignore':
+        raise ValueError("El OneHotEncoder debe tener una columna, sin drop y con handle_unknown='ignore'")
+
+    n_num = len(columnas_numericas)
+    medias = scaler.mean_ if scaler.with_mean else np.zeros(n_num)
+    escalas = scaler.scale_ if scaler.with_std else np.ones(n_num)
+    categorias = encoder.categories_[0]
+
+    centros = kmeans.cluster_centers_
+    if centros.shape[1] != n_num + len(categorias):
+        raise ValueError("Las dimensiones de los centroides no coinciden con el preprocesador")
+
+    return CompiledModel(
+        columnas_numericas=columnas_numericas,
+        medias=medias,
+        escalas=escalas,
+        columna_categorica=columnas_categoricas[0],
+        categorias=categorias,
+        centros=centros,
+    )
@@ -1,7 +1,127 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 from joblib import load
 
+from ml.compiled_model import exportar_modelo
+from ml.prediction_cache import PredictionCache, parse_quantization
+
+logger = logging.getLogger(__name__)
+
+# Por defecto los artefactos viven junto a main.py, sin depender del directorio de trabajo
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREPROCESSOR_PATH = os.getenv('CYRCE_PREPROCESSOR_PATH', os.path.join(BASE_DIR, 'preprocessor.pkl'))
+KMEANS_PATH = os.getenv('CYRCE_KMEANS_PATH', os.path.join(BASE_DIR, 'kmeans_model.pkl'))
+# Segundos entre revisiones del mtime de los artefactos (0 = revisar en cada llamada)
+MODEL_CHECK_INTERVAL = float(os.getenv('CYRCE_MODEL_CHECK_INTERVAL', '5'))
+# Caché de predicciones (CYRCE_CACHE_SIZE=0 la desactiva)
+CACHE_SIZE = int(os.getenv('CYRCE_CACHE_SIZE', '50000'))
+CACHE_TTL = float(os.getenv('CYRCE_CACHE_TTL', '3600'))
+CACHE_QUANTIZATION = parse_quantization(os.getenv('CYRCE_CACHE_QUANTIZATION', ''))
+# Hilos dedicados a la inferencia, para no ocupar el event loop ni el threadpool de FastAPI
+EXECUTOR_WORKERS = int(os.getenv('CYRCE_EXECUTOR_WORKERS', '2'))
+
+
+class ModelArtifacts:
+    """
+    Par preprocessor + kmeans cargado en conjunto, junto con su versión compilada
+    en NumPy. Nunca se modifica después de creado.
+    """
+
+    def __init__(self, preprocessor, kmeans, signature, version: int, compiled=None):
+        self.preprocessor = preprocessor
+        self.kmeans = kmeans
+        self.compiled = compiled
+        self.signature = signature
+        self.version = version
+
+
+class ModelRegistry:
+    """
+    Carga los artefactos del modelo una sola vez por proceso y los recarga en caliente
+    cuando cambia el mtime o el tamaño de alguno de los archivos.
+
+    El par se reemplaza como una sola referencia, así que cada request ve el par
+    viejo completo o el nuevo completo, nunca una mezcla.
+    """
+
+    def __init__(self, preprocessor_path: str, kmeans_path: str, check_interval: float = MODEL_CHECK_INTERVAL):
+        self.preprocessor_path = preprocessor_path
+        self.kmeans_path = kmeans_path
+        self.check_interval = check_interval
+        self._artifacts = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        firma = []
+        for path in (self.preprocessor_path, self.kmeans_path):
+            stat = os.stat(path)
+            firma.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(firma)
+
+    def get(self) -> ModelArtifacts:
+        """
+        Regresa el par de artefactos vigente, recargándolo si los archivos cambiaron
+        """
+        artifacts = self._artifacts
+        now = time.monotonic()
+        if artifacts is not None and now - self._last_check < self.check_interval:
+            return artifacts
+
+        with self._lock:
+            artifacts = self._artifacts
+            if artifacts is not None and now - self._last_check < self.check_interval:
+                return artifacts
+            self._last_check = now
+            try:
+                signature = self._signature()
+            except OSError as e:
+                if artifacts is None:
+                    raise
+                logger.warning(f"No se pudo revisar los artefactos del modelo, se conserva la versión {artifacts.version}: {e}")
+                return artifacts
+
+            if artifacts is not None and artifacts.signature == signature:
+                return artifacts
+
+            try:
+                preprocessor = load(self.preprocessor_path)
+                kmeans = load(self.kmeans_path)
+                # Si los archivos cambiaron mientras se cargaban, se reintenta en la siguiente revisión
+                if self._signature() != signature:
+                    raise ValueError("los artefactos cambiaron durante la carga")
+            except Exception as e:
+                if artifacts is None:
+                    raise
+                logger.warning(f"No se pudo recargar el modelo, se conserva la versión {artifacts.version}: {e}")
+                return artifacts
+
+            try:
+                compiled = exportar_modelo(preprocessor, kmeans)
+            except ValueError as e:
+                logger.warning(f"No se pudo compilar el modelo, se usará sklearn: {e}")
+                compiled = None
+
+            version = artifacts.version + 1 if artifacts is not None else 1
+            self._artifacts = ModelArtifacts(preprocessor, kmeans, signature, version, compiled)
+            logger.info(f"Modelo Cyrce cargado (versión {version})")
+            return self._artifacts
+
+
+# Registro global del proceso
+model_registry = ModelRegistry(PREPROCESSOR_PATH, KMEANS_PATH)
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL, CACHE_QUANTIZATION)
+inference_executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="cyrce")
+
+
 def predecir_cluster(ticket_promedio, frecuencia_compra, variabilidad, recencia, meses_activo, 
                     dist_hospital_m, dist_escuela_m, dist_gimnasio_m, dist_oficina_m, 
                     categoria_mas_frecuente):
@@ -24,15 +144,10 @@ def predecir_cluster(ticket_promedio, frecuencia_compra, variabilidad, recencia,
     - cluster: Número del cluster asignado (0-4)
     """
     
-    # Cargar modelos entrenados
-    preprocessor = load("preprocessor.pkl")
-    kmeans = load("kmeans_model.pkl")
-    
-    # Crear DataFrame con los datos del nuevo cliente
-    nuevo_cliente = pd.DataFrame([{
-        'ticket_promedio_log': np.log1p(ticket_promedio),
-        'frecuencia_compra_log': np.log1p(frecuencia_compra),
-        'variabilidad_log': np.log1p(variabilidad),
+    cliente = {
+        'ticket_promedio': ticket_promedio,
+        'frecuencia_compra': frecuencia_compra,
+        'variabilidad': variabilidad,
         'recencia': recencia,
         'meses_activo': meses_activo,
         'dist_hospital_m': dist_hospital_m,
@@ -40,13 +155,96 @@ def predecir_cluster(ticket_promedio, frecuencia_compra, variabilidad, recencia,
         'dist_gimnasio_m': dist_gimnasio_m,
         'dist_oficina_m': dist_oficina_m,
         'categoria_mas_frecuente': categoria_mas_frecuente
+    }
+    
+    # Obtener modelos entrenados (cargados una vez por proceso)
+    artifacts = model_registry.get()
+    
+    if prediction_cache.enabled:
+        cluster = prediction_cache.get(artifacts.version, cliente)
+        if cluster is not None:
+            return cluster
+    
+    cluster = _predecir(artifacts, cliente)
+    
+    if prediction_cache.enabled:
+        prediction_cache.put(artifacts.version, cliente, cluster)
+    
+    return cluster
+
+def _predecir(artifacts, cliente):
+    # Ruta rápida: mismo pipeline evaluado directamente en NumPy
+    if artifacts.compiled is not None:
+        return artifacts.compiled.predecir(cliente)
+    
+    # Crear DataFrame con los datos del nuevo cliente
+    nuevo_cliente = pd.DataFrame([{
+        'ticket_promedio_log': np.log1p(cliente['ticket_promedio']),
+        'frecuencia_compra_log': np.log1p(cliente['frecuencia_compra']),
+        'variabilidad_log': np.log1p(cliente['variabilidad']),
+        'recencia': cliente['recencia'],
+        'meses_activo': cliente['meses_activo'],
+        'dist_hospital_m': cliente['dist_hospital_m'],
+        'dist_escuela_m': cliente['dist_escuela_m'],
+        'dist_gimnasio_m': cliente['dist_gimnasio_m'],
+        'dist_oficina_m': cliente['dist_oficina_m'],
+        'categoria_mas_frecuente': cliente['categoria_mas_frecuente']
     }])
     
     # Transformar y predecir
-    X_nuevo = preprocessor.transform(nuevo_cliente)
-    cluster_asignado = kmeans.predict(X_nuevo)
+    X_nuevo = artifacts.preprocessor.transform(nuevo_cliente)
+    cluster_asignado = artifacts.kmeans.predict(X_nuevo)
+    
+    return int(cluster_asignado[0])
+
+def predecir_clusters(clientes):
+    """
+    Predice el cluster de muchos clientes con una sola transformación y predicción vectorizada.
     
-    return cluster_asignado[0]
+    Parámetros requeridos:
+    - clientes: Lista de diccionarios con los mismos campos que recibe predecir_cluster
+    
+    Retorna:
+    - clusters: Lista de números de cluster, en el mismo orden que la entrada
+    """
+    if not clientes:
+        return []
+
+    artifacts = model_registry.get()
+    if artifacts.compiled is not None:
+        return artifacts.compiled.predecir_lote(clientes)
+
+    df = pd.DataFrame.from_records(clientes)
+    nuevos_clientes = pd.DataFrame({
+        'ticket_promedio_log': np.log1p(df['ticket_promedio'].to_numpy(dtype=float)),
+        'frecuencia_compra_log': np.log1p(df['frecuencia_compra'].to_numpy(dtype=float)),
+        'variabilidad_log': np.log1p(df['variabilidad'].to_numpy(dtype=float)),
+        'recencia': df['recencia'],
+        'meses_activo': df['meses_activo'],
+        'dist_hospital_m': df['dist_hospital_m'],
+        'dist_escuela_m': df['dist_escuela_m'],
+        'dist_gimnasio_m': df['dist_gimnasio_m'],
+        'dist_oficina_m': df['dist_oficina_m'],
+        'categoria_mas_frecuente': df['categoria_mas_frecuente']
+    })
+
+    X_nuevos = artifacts.preprocessor.transform(nuevos_clientes)
+    return artifacts.kmeans.predict(X_nuevos).tolist()
+
+async def predecir_cluster_async(**kwargs):
+    """
+    Ejecuta predecir_cluster en el executor de inferencia y espera el resultado
+    sin bloquear el event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, functools.partial(predecir_cluster, **kwargs))
+
+async def predecir_clusters_async(clientes):
+    """
+    Ejecuta predecir_clusters en el executor de inferencia
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, predecir_clusters, clientes)
 
 # Ejemplo de uso:
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Paso de cuantización por defecto para cada campo de entrada; los campos sin paso se usan tal cual
+DEFAULT_QUANTIZATION = {
+    'ticket_promedio': 0.1,
+    'frecuencia_compra': 0.1,
+    'variabilidad': 0.1,
+    'recencia': 1,
+    'meses_activo': 1,
+    'dist_hospital_m': 50,
+    'dist_escuela_m': 50,
+    'dist_gimnasio_m': 50,
+    'dist_oficina_m': 50,
+}
+
+
+def parse_quantization(spec: str) -> dict:
+    """
+    Convierte 'campo=paso,campo=paso' en un diccionario, partiendo de DEFAULT_QUANTIZATION
+    """
+    quantization = dict(DEFAULT_QUANTIZATION)
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        campo, paso = item.split('=', 1)
+        quantization[campo.strip()] = float(paso)
+    return quantization
+
+
+class PredictionCache:
+    """
+    Caché LRU con expiración por TTL de predicciones de cluster, con llave en las
+    características del cliente cuantizadas.
+
+    Cada entrada queda asociada a la versión del modelo que la produjo; cuando el
+    registro carga una versión nueva la caché se vacía.
+    """
+
+    def __init__(self, max_size: int, ttl: float, quantization: dict = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.quantization = quantization or dict(DEFAULT_QUANTIZATION)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def key(self, cliente: dict) -> tuple:
+        llave = []
+        for campo in sorted(cliente):
+            valor = cliente[campo]
+            paso = self.quantization.get(campo)
+            if paso and isinstance(valor, (int, float)):
+                valor = math.floor(valor / paso + 0.5)
+            llave.append((campo, valor))
+        return tuple(llave)
+
+    def _sync_version(self, version: int):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version: int, cliente: dict):
+        """
+        Regresa el cluster en caché o None si no hay una entrada vigente
+        """
+        key = self.key(cliente)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, version: int, cliente: dict, cluster: int):
+        key = self.key(cliente)
+        with self._lock:
+            self._sync_version(version)
+            self._entries[key] = (cluster, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "model_version": self._version,
+            }
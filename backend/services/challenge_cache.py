@@ -0,0 +1,109 @@
+import copy
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Días entre hoy y la fecha límite de un reto (ver GeminiService._build_prompt)
+DEADLINE_DAYS = 30
+
+
+def period_expiration(deadline_str: str) -> datetime:
+    """
+    Momento en que la fecha límite calculada hoy cambia de mes, es decir, cuando
+    un reto generado con este periodo deja de poder reutilizarse
+    """
+    deadline = datetime.strptime(deadline_str, "%Y-%m-%d")
+    next_month = (deadline.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return next_month - timedelta(days=DEADLINE_DAYS)
+
+
+class ChallengeCache:
+    """
+    Caché persistente en Mongo de retos generados por el LLM.
+
+    Cada llave (huella del prompt normalizado) guarda hasta max_variants retos
+    distintos. Mientras no se llenan las variantes cada consulta cuenta como
+    fallo, para que se generen nuevas; después se sirven en rotación.
+    """
+
+    def __init__(self, collection_getter, collection_name: str, max_variants: int):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+        self.max_variants = max_variants
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_variants > 0
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    async def ensure_indexes(self):
+        # Mongo borra las entradas cuando pasa su expires_at
+        await self.collection.create_index("expires_at", name="expires_at", expireAfterSeconds=0)
+
+    async def get(self, fingerprint: str, deadline_str: str) -> Optional[Dict[str, Any]]:
+        """
+        Regresa la siguiente variante en rotación, o None si hay que generar una nueva
+        """
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": fingerprint, "expires_at": {"$gt": datetime.utcnow()}},
+                {"$inc": {"served": 1}},
+                projection={"variants": 1, "served": 1},
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Error leyendo la caché de retos: {e}")
+            return None
+
+        variants = (doc or {}).get("variants", [])
+        if len(variants) < self.max_variants:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        challenge = copy.deepcopy(variants[doc["served"] % len(variants)])
+        challenge["fecha_limite"] = deadline_str
+        return challenge
+
+    async def put(self, fingerprint: str, deadline_str: str, challenge: Dict[str, Any]):
+        """
+        Agrega un reto a las variantes de la llave, conservando las max_variants más recientes
+        """
+        try:
+            await self.collection.update_one(
+                {"_id": fingerprint},
+                {
+                    "$push": {"variants": {"$each": [challenge], "$slice": -self.max_variants}},
+                    "$setOnInsert": {
+                        "periodo": deadline_str[:7],
+                        "expires_at": period_expiration(deadline_str),
+                        "served": 0
+                    }
+                },
+                upsert=True
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Error guardando en la caché de retos: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "max_variants": self.max_variants,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "errors": self.errors
+        }
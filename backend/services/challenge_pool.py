@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+
+class ChallengePool:
+    """
+    Pool persistente en Mongo de retos pre-generados por (cluster_id, tipo de producto).
+
+    Un worker en segundo plano mantiene cada pool entre low_watermark y
+    high_watermark retos para el periodo vigente; /store solo saca uno
+    (find_one_and_delete sobre un índice) y únicamente llama al LLM cuando
+    el pool está vacío. Los pools son por cluster de KMeans y solo se llenan
+    los tipos de producto que ese cluster puede recibir.
+    """
+
+    def __init__(self, collection_getter, collection_name: str, enabled: bool,
+                 low_watermark: int, high_watermark: int, refill_interval: float):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+        self.enabled = enabled
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.refill_interval = refill_interval
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._clusters: Dict[int, Dict[str, Any]] = {}
+        self._task = None
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    def key(self, cluster_id: int, product_type: str) -> str:
+        return f"{cluster_id}:{product_type}"
+
+    async def pop(self, key: str, deadline_str: str) -> Optional[Dict[str, Any]]:
+        """
+        Saca el reto más antiguo del pool para el periodo vigente, o None si está vacío
+        """
+        try:
+            doc = await self.collection.find_one_and_delete(
+                {"key": key, "periodo": deadline_str[:7]},
+                sort=[("created_at", ASCENDING)]
+            )
+        except Exception as e:
+            logger.warning(f"Error leyendo el pool de retos: {e}")
+            doc = None
+
+        if doc is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        challenge = doc["challenge"]
+        challenge["fecha_limite"] = deadline_str
+        return challenge
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("key", ASCENDING), ("periodo", ASCENDING), ("created_at", ASCENDING)],
+            name="key_periodo_created_at"
+        )
+
+    async def refill(self, service, clusters: Dict[int, Dict[str, Any]]):
+        """
+        Completa hasta high_watermark los pools que estén por debajo de low_watermark.
+        clusters mapea el cluster_id de KMeans a su cluster_info.
+        """
+        deadline_str = service._deadline_str()
+        periodo = deadline_str[:7]
+
+        # Los retos de periodos anteriores ya no se pueden servir
+        await self.collection.delete_many({"periodo": {"$ne": periodo}})
+
+        for cluster_id, cluster_info in clusters.items():
+            for product_type, products in service.pool_targets(cluster_info).items():
+                key = self.key(cluster_id, product_type)
+                count = await self.collection.count_documents({"key": key, "periodo": periodo})
+                if count >= self.low_watermark:
+                    continue
+
+                try:
+                    for _ in range(self.high_watermark - count):
+                        challenge = await service.generate_pool_challenge(cluster_info, products, deadline_str)
+                        await self.collection.insert_one({
+                            "key": key,
+                            "periodo": periodo,
+                            "challenge": challenge,
+                            "created_at": datetime.utcnow()
+                        })
+                        self.generated += 1
+                except Exception as e:
+                    # Se reintenta en la siguiente vuelta; los demás pools siguen
+                    logger.warning(f"Error generando retos para el pool {key}: {e}")
+
+    async def _run(self, service):
+        while True:
+            try:
+                await self.refill(service, self._clusters)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error rellenando el pool de retos: {e}")
+            await asyncio.sleep(self.refill_interval)
+
+    async def start(self, service, clusters: Dict[int, Dict[str, Any]]):
+        if not self.enabled or self._task is not None:
+            return
+        self._clusters = clusters
+        try:
+            await self.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"No se pudieron crear los índices del pool de retos: {e}")
+        self._task = asyncio.create_task(self._run(service))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "low_watermark": self.low_watermark,
+            "high_watermark": self.high_watermark,
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated
+        }
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Se lanza cuando el circuito está abierto y la llamada no se intenta
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker con estados closed / open / half_open.
+
+    En closed se guardan las últimas window_size llamadas; si hay al menos
+    min_calls y la tasa de error o el p95 de latencia pasan su umbral, el
+    circuito se abre. Abierto rechaza todo durante cooldown segundos y luego
+    pasa a half_open, donde deja pasar hasta half_open_max_calls pruebas:
+    si todas salen bien se cierra, si alguna falla se vuelve a abrir.
+    """
+
+    def __init__(self, name: str, error_rate_threshold: float, p95_latency_threshold: float,
+                 window_size: int = 50, min_calls: int = 10, cooldown: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.error_rate_threshold = error_rate_threshold
+        self.p95_latency_threshold = p95_latency_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.opened_at = None
+        self.last_trip_reason = None
+        self.rejected = 0
+        self.trips = 0
+        self._window = deque(maxlen=window_size)
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Indica si se puede intentar la llamada; si regresa True hay que reportar
+        el resultado con record_success o record_failure
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._half_open_in_flight = 0
+                self._half_open_successes = 0
+
+            if self.state == HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self._half_open_in_flight += 1
+
+            return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._close()
+                return
+            self._window.append((True, latency))
+            self._evaluate()
+
+    def record_failure(self, latency: float):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open("falló la llamada de prueba")
+                return
+            self._window.append((False, latency))
+            self._evaluate()
+
+    def record_cancelled(self):
+        """
+        La llamada se canceló sin resultado; libera el lugar de prueba en half_open
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def _evaluate(self):
+        if self.state != CLOSED or len(self._window) < self.min_calls:
+            return
+        error_rate = self._error_rate()
+        if error_rate >= self.error_rate_threshold:
+            self._open(f"tasa de error {error_rate:.0%}")
+            return
+        p95 = self._p95()
+        if p95 >= self.p95_latency_threshold:
+            self._open(f"p95 de latencia {p95 * 1000:.0f} ms")
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.last_trip_reason = reason
+        self.trips += 1
+        self._window.clear()
+
+    def _close(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self._window.clear()
+
+    def _error_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        return sum(1 for ok, _ in self._window if not ok) / len(self._window)
+
+    def _p95(self) -> float:
+        if not self._window:
+            return 0.0
+        latencies = sorted(latency for _, latency in self._window)
+        return latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(self.cooldown - (time.monotonic() - self.opened_at), 0.0), 2)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "window_calls": len(self._window),
+                "error_rate": round(self._error_rate(), 4),
+                "p95_ms": round(self._p95() * 1000, 2),
+                "error_rate_threshold": self.error_rate_threshold,
+                "p95_latency_threshold_ms": round(self.p95_latency_threshold * 1000, 2),
+                "cooldown_seconds": self.cooldown,
+                "retry_in_seconds": retry_in,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "last_trip_reason": self.last_trip_reason
+            }
@@ -1,12 +1,50 @@
-import google.generativeai as genai
+import asyncio
+import copy
+import hashlib
 import os
+import re
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 import json
 from dotenv import load_dotenv
 
+from db.store import get_async_collection
+from services.challenge_cache import ChallengeCache
+from services.challenge_pool import ChallengePool
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.llm_providers import create_provider
+from services.metrics import LatencyRecorder
+
 load_dotenv()
 KEY = os.getenv('GEMINI')
+# Máximo de llamadas simultáneas a Gemini por proceso
+MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+# Tiempo máximo por llamada (incluye la espera por un lugar en el semáforo)
+TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '10'))
+# Circuit breaker: se abre por tasa de error o p95 de latencia en la ventana reciente
+BREAKER_ERROR_RATE = float(os.getenv('GEMINI_BREAKER_ERROR_RATE', '0.5'))
+BREAKER_P95_SECONDS = float(os.getenv('GEMINI_BREAKER_P95_SECONDS', '8'))
+BREAKER_WINDOW = int(os.getenv('GEMINI_BREAKER_WINDOW', '50'))
+BREAKER_MIN_CALLS = int(os.getenv('GEMINI_BREAKER_MIN_CALLS', '10'))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv('GEMINI_BREAKER_COOLDOWN_SECONDS', '30'))
+# Generación por lotes: tiendas por prompt, reintentos de elementos inválidos y tiempo por llamada
+BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '20'))
+BATCH_MAX_RETRIES = int(os.getenv('GEMINI_BATCH_MAX_RETRIES', '2'))
+BATCH_TIMEOUT_SECONDS = float(os.getenv('GEMINI_BATCH_TIMEOUT_SECONDS', '60'))
+# Los lotes usan su propio semáforo y circuit breaker para no afectar las llamadas de /store
+BATCH_MAX_CONCURRENCY = int(os.getenv('GEMINI_BATCH_MAX_CONCURRENCY', '2'))
+BATCH_BREAKER_P95_SECONDS = float(os.getenv('GEMINI_BATCH_BREAKER_P95_SECONDS', '50'))
+BATCH_BREAKER_MIN_CALLS = int(os.getenv('GEMINI_BATCH_BREAKER_MIN_CALLS', '5'))
+# Variantes de reto guardadas por prompt (0 desactiva la caché de retos)
+CHALLENGE_CACHE_VARIANTS = int(os.getenv('CHALLENGE_CACHE_VARIANTS', '5'))
+CHALLENGE_CACHE_COLLECTION = os.getenv('CHALLENGE_CACHE_COLLECTION', 'challenge_cache')
+# Pool de retos pre-generados por (cluster, tipo de producto); cada proceso que lo
+# tenga activo lo rellena por su cuenta, así que conviene activarlo en un solo worker
+CHALLENGE_POOL_ENABLED = os.getenv('CHALLENGE_POOL_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+CHALLENGE_POOL_COLLECTION = os.getenv('CHALLENGE_POOL_COLLECTION', 'challenge_pool')
+CHALLENGE_POOL_LOW_WATERMARK = int(os.getenv('CHALLENGE_POOL_LOW_WATERMARK', '5'))
+CHALLENGE_POOL_HIGH_WATERMARK = int(os.getenv('CHALLENGE_POOL_HIGH_WATERMARK', '20'))
+CHALLENGE_POOL_REFILL_INTERVAL = float(os.getenv('CHALLENGE_POOL_REFILL_INTERVAL', '60'))
 
 class GeminiService:
     """
@@ -15,7 +53,56 @@ class GeminiService:
     
     def __init__(self):
         self.api_key = KEY
-        self.model = genai.GenerativeModel('gemini-pro')
+        # Backend de LLM seleccionado con LLM_PROVIDER (gemini, fake o replay)
+        self.provider = create_provider()
+        self.timeout = TIMEOUT_SECONDS
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        self.max_concurrency = MAX_CONCURRENCY
+        self.in_flight = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.queue_wait = LatencyRecorder()
+        self.call_latency = LatencyRecorder()
+        self.circuit_breaker = CircuitBreaker(
+            "gemini",
+            error_rate_threshold=BREAKER_ERROR_RATE,
+            p95_latency_threshold=BREAKER_P95_SECONDS,
+            window_size=BREAKER_WINDOW,
+            min_calls=BREAKER_MIN_CALLS,
+            cooldown=BREAKER_COOLDOWN_SECONDS
+        )
+        self.short_circuited = 0
+        # Llamadas descartadas porque se venció el plazo esperando el semáforo
+        self.load_shed = 0
+        self._batch_semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+        self.batch_circuit_breaker = CircuitBreaker(
+            "gemini-batch",
+            error_rate_threshold=BREAKER_ERROR_RATE,
+            p95_latency_threshold=BATCH_BREAKER_P95_SECONDS,
+            window_size=BREAKER_WINDOW,
+            min_calls=BATCH_BREAKER_MIN_CALLS,
+            cooldown=BREAKER_COOLDOWN_SECONDS
+        )
+        self.batch_calls = 0
+        self.batch_timeouts = 0
+        self.batch_errors = 0
+        self.batch_short_circuited = 0
+        self.batch_items = 0
+        self.batch_retried_items = 0
+        self.batch_fallbacks = 0
+        # Llamadas en curso por huella de prompt, compartidas entre solicitudes idénticas
+        self._pending_prompts = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self.challenge_cache = ChallengeCache(get_async_collection, CHALLENGE_CACHE_COLLECTION, CHALLENGE_CACHE_VARIANTS)
+        self.challenge_pool = ChallengePool(
+            get_async_collection,
+            CHALLENGE_POOL_COLLECTION,
+            enabled=CHALLENGE_POOL_ENABLED,
+            low_watermark=CHALLENGE_POOL_LOW_WATERMARK,
+            high_watermark=CHALLENGE_POOL_HIGH_WATERMARK,
+            refill_interval=CHALLENGE_POOL_REFILL_INTERVAL
+        )
         
         # Mapeo de categorías a tipos de productos
         self.category_to_product_type = {
@@ -149,21 +236,359 @@ class GeminiService:
         """
         Genera un reto personalizado usando Gemini
         """
+        prompt, products, deadline_str = self._build_prompt(cluster_info, user_data)
+        
+        try:
+            text = self.provider.generate_sync(prompt)
+            return self._parse_challenge(text, products)
+            
+        except Exception as e:
+            # Fallback challenge si falla Gemini
+            return self._generate_fallback_challenge(cluster_info, user_data, products, deadline_str)
+    
+    async def generate_challenge_async(self, cluster_info: Dict, user_data: Dict, cluster_id: int = None) -> Dict[str, Any]:
+        """
+        Igual que generate_challenge, pero usando el cliente asíncrono de Gemini
+        para no bloquear el event loop. cluster_id es el cluster de KMeans de la
+        tienda; sin él no se usa el pool de retos.
+        """
+        deadline_str = self._deadline_str()
+        _, product_type, products = self._select_products(cluster_info, user_data)
+        
+        # Tomar un reto pre-generado del pool si hay alguno
+        if self.challenge_pool.enabled and cluster_id is not None:
+            pooled = await self.challenge_pool.pop(self.challenge_pool.key(cluster_id, product_type), deadline_str)
+            if pooled is not None:
+                return pooled
+        
+        prompt = self._render_prompt(cluster_info, user_data, products, deadline_str)
+        
+        # Reutilizar un reto ya generado para el mismo prompt en este periodo
+        fingerprint = self._prompt_fingerprint(prompt, deadline_str)
+        if self.challenge_cache.enabled:
+            cached = await self.challenge_cache.get(fingerprint, deadline_str)
+            if cached is not None:
+                return cached
+        
+        try:
+            return await self._generate_shared(fingerprint, prompt, products, deadline_str)
+            
+        except Exception as e:
+            # Fallback challenge si falla Gemini o se vence el tiempo límite
+            return self._generate_fallback_challenge(cluster_info, user_data, products, deadline_str)
+    
+    def pool_targets(self, cluster_info: Dict) -> Dict[str, Dict]:
+        """
+        Tipos de producto (con sus productos) que _select_products puede elegir para
+        el cluster; son los únicos pools de los que /store llega a sacar retos
+        """
+        targets = {}
+        for categoria in self.category_to_product_type:
+            _, product_type, products = self._select_products(cluster_info, {"categoria_mas_frecuente": categoria})
+            targets[product_type] = products
+        return targets
+    
+    async def generate_pool_challenge(self, cluster_info: Dict, products: Dict, deadline_str: str) -> Dict[str, Any]:
+        """
+        Genera un reto para el pool de un cluster y tipo de producto. Lanza la excepción
+        si Gemini falla, para no llenar el pool con retos por defecto.
+        """
+        prompt = self._render_prompt(cluster_info, {}, products, deadline_str)
+        
+        text = await self._generate_text_async(prompt)
+        return self._parse_challenge(text, products)
+    
+    async def generate_challenges_batch(self, stores: List[Tuple[Dict, Dict]]) -> List[Dict[str, Any]]:
+        """
+        Genera retos para muchas tiendas pidiendo a Gemini hasta BATCH_SIZE retos por
+        prompt. Cada elemento de la respuesta se valida contra el esquema del reto y
+        solo los inválidos se vuelven a pedir; si siguen fallando se usa el reto por defecto.
+        
+        Parámetros:
+        - stores: Lista de (cluster_info, user_data)
+        
+        Retorna:
+        - Lista de retos en el mismo orden que stores
+        """
+        deadline_str = self._deadline_str()
+        products = [self._select_products(cluster_info, user_data)[2] for cluster_info, user_data in stores]
+        results: List[Any] = [None] * len(stores)
+        
+        pending = list(range(len(stores)))
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                self.batch_retried_items += len(pending)
+            
+            chunks = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+            outcomes = await asyncio.gather(*[
+                self._generate_batch_chunk([stores[i] for i in chunk], [products[i] for i in chunk], deadline_str)
+                for chunk in chunks
+            ])
+            
+            pending = []
+            for chunk, challenges in zip(chunks, outcomes):
+                for index, challenge in zip(chunk, challenges):
+                    if challenge is None:
+                        pending.append(index)
+                    else:
+                        results[index] = challenge
+        
+        for index in pending:
+            cluster_info, user_data = stores[index]
+            self.batch_fallbacks += 1
+            results[index] = self._generate_fallback_challenge(cluster_info, user_data, products[index], deadline_str)
+        
+        return results
+    
+    async def _generate_batch_chunk(self, stores: List[Tuple[Dict, Dict]], products: List[Dict], deadline_str: str) -> List[Any]:
+        """
+        Una llamada a Gemini para un bloque de tiendas; regresa un reto o None por tienda
+        """
+        self.batch_calls += 1
+        self.batch_items += len(stores)
+        prompt = self._render_batch_prompt(stores, products, deadline_str)
+        
+        try:
+            text = await self._generate_batch_text_async(prompt)
+            items = json.loads(self._strip_code_fences(text))
+        except Exception as e:
+            return [None] * len(stores)
+        
+        if not isinstance(items, list):
+            return [None] * len(stores)
+        
+        # Acomodar por "indice" si viene; si no, por posición
+        by_index = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            index = item.pop("indice", position + 1)
+            if isinstance(index, int) and 1 <= index <= len(stores):
+                by_index.setdefault(index - 1, item)
+        
+        challenges = []
+        for i, store_products in enumerate(products):
+            item = by_index.get(i)
+            if item is None or not self._is_valid_challenge(item):
+                challenges.append(None)
+                continue
+            item["fecha_limite"] = deadline_str
+            item["imagen_producto"] = store_products["imagenes"][0]
+            item["productos_sugeridos"] = store_products["productos"]
+            item["imagenes_productos"] = store_products["imagenes"]
+            challenges.append(item)
+        
+        return challenges
+    
+    def _is_valid_challenge(self, challenge: Dict[str, Any]) -> bool:
+        """
+        Revisa que un reto tenga los campos del formato de respuesta con el tipo correcto
+        """
+        for field in ("titulo", "descripcion", "unidad_medida", "producto_objetivo", "incentivo"):
+            if not isinstance(challenge.get(field), str) or not challenge[field].strip():
+                return False
+        meta = challenge.get("meta_numerica")
+        if isinstance(meta, bool) or not isinstance(meta, (int, float)) or meta <= 0:
+            return False
+        tips = challenge.get("tips")
+        return isinstance(tips, list) and all(isinstance(tip, str) for tip in tips)
+    
+    def _strip_code_fences(self, text: str) -> str:
+        text = text.strip()
+        if text.startswith("```"):
+            text = re.sub(r"^```[a-zA-Z]*\s*", "", text)
+            text = re.sub(r"\s*```$", "", text)
+        return text
+    
+    async def _generate_shared(self, fingerprint: str, prompt: str, products: Dict, deadline_str: str) -> Dict[str, Any]:
+        """
+        Single-flight: si ya hay una llamada en curso con la misma huella se espera esa
+        en lugar de hacer otra. Cada solicitante recibe su propia copia del reto.
+        """
+        task = self._pending_prompts.get(fingerprint)
+        if task is not None:
+            self.coalesced_calls += 1
+        else:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(self._generate_and_store(fingerprint, prompt, products, deadline_str))
+            self._pending_prompts[fingerprint] = task
+            task.add_done_callback(lambda _: self._pending_prompts.pop(fingerprint, None))
+        
+        # shield: si se cancela un solicitante, la llamada sigue para los demás
+        challenge = await asyncio.shield(task)
+        return copy.deepcopy(challenge)
+    
+    async def _generate_and_store(self, fingerprint: str, prompt: str, products: Dict, deadline_str: str) -> Dict[str, Any]:
+        text = await self._generate_text_async(prompt)
+        challenge = self._parse_challenge(text, products)
+        
+        if self.challenge_cache.enabled:
+            await self.challenge_cache.put(fingerprint, deadline_str, challenge)
+        
+        return challenge
+    
+    async def _generate_batch_text_async(self, prompt: str) -> str:
+        """
+        Llamada de un bloque del lote: usa el semáforo y el circuit breaker de lotes, y
+        BATCH_TIMEOUT_SECONDS cuenta desde que se obtiene lugar en el semáforo
+        """
+        async with self._batch_semaphore:
+            if not self.batch_circuit_breaker.allow_request():
+                self.batch_short_circuited += 1
+                raise CircuitOpenError("Circuito de lotes de Gemini abierto")
+            
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                text = await asyncio.wait_for(self.provider.generate(prompt), timeout=BATCH_TIMEOUT_SECONDS)
+                self.batch_circuit_breaker.record_success(loop.time() - start)
+                return text
+            except asyncio.TimeoutError:
+                self.batch_timeouts += 1
+                self.batch_circuit_breaker.record_failure(loop.time() - start)
+                raise
+            except asyncio.CancelledError:
+                self.batch_circuit_breaker.record_cancelled()
+                raise
+            except Exception:
+                self.batch_errors += 1
+                self.batch_circuit_breaker.record_failure(loop.time() - start)
+                raise
+    
+    async def _generate_text_async(self, prompt: str) -> str:
+        """
+        Llama a Gemini respetando el circuit breaker, el límite de concurrencia y el
+        tiempo máximo por llamada. Lanza CircuitOpenError si el circuito está abierto
+        y asyncio.TimeoutError si se vence el plazo. Al circuit breaker solo llega
+        la latencia de Gemini: la espera por el semáforo es carga local, y si se
+        vence ahí la llamada se descarta sin contarla como falla de Gemini.
+        """
+        if not self.circuit_breaker.allow_request():
+            self.short_circuited += 1
+            raise CircuitOpenError("Circuito de Gemini abierto")
+        
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.timeout
+        
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.load_shed += 1
+            self.queue_wait.record(loop.time() - start)
+            self.circuit_breaker.record_cancelled()
+            raise
+        except asyncio.CancelledError:
+            self.circuit_breaker.record_cancelled()
+            raise
+        
+        acquired = loop.time()
+        self.queue_wait.record(acquired - start)
+        self.in_flight += 1
+        try:
+            text = await asyncio.wait_for(
+                self.provider.generate(prompt),
+                timeout=max(deadline - acquired, 0)
+            )
+            self.circuit_breaker.record_success(loop.time() - acquired)
+            return text
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.circuit_breaker.record_failure(loop.time() - acquired)
+            raise
+        except asyncio.CancelledError:
+            self.circuit_breaker.record_cancelled()
+            raise
+        except Exception:
+            self.errors += 1
+            self.circuit_breaker.record_failure(loop.time() - acquired)
+            raise
+        finally:
+            self.call_latency.record(loop.time() - acquired)
+            self.in_flight -= 1
+            self._semaphore.release()
+    
+    def _prompt_fingerprint(self, prompt: str, deadline_str: str) -> str:
+        """
+        Huella del prompt normalizado: la fecha límite se reduce a su mes y se
+        colapsan los espacios, para que retos del mismo periodo compartan llave
+        """
+        normalized = prompt.replace(deadline_str, deadline_str[:7])
+        normalized = re.sub(r"\s+", " ", normalized).strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Métricas de las llamadas asíncronas a Gemini
+        """
+        return {
+            "provider": self.provider.name,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "short_circuited": self.short_circuited,
+            "load_shed": self.load_shed,
+            "batch": {
+                "max_concurrency": BATCH_MAX_CONCURRENCY,
+                "timeout_seconds": BATCH_TIMEOUT_SECONDS,
+                "calls": self.batch_calls,
+                "items": self.batch_items,
+                "retried_items": self.batch_retried_items,
+                "fallbacks": self.batch_fallbacks,
+                "timeouts": self.batch_timeouts,
+                "errors": self.batch_errors,
+                "short_circuited": self.batch_short_circuited,
+                "circuit_breaker": self.batch_circuit_breaker.snapshot()
+            },
+            "queue_wait": self.queue_wait.snapshot(),
+            "call_latency": self.call_latency.snapshot(),
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "challenge_cache": self.challenge_cache.stats(),
+            "challenge_pool": self.challenge_pool.stats(),
+            "circuit_breaker": self.circuit_breaker.snapshot()
+        }
+    
+    def _build_prompt(self, cluster_info: Dict, user_data: Dict):
+        """
+        Construye el prompt para Gemini y regresa (prompt, productos, fecha límite)
+        """
+        deadline_str = self._deadline_str()
+        _, _, products = self._select_products(cluster_info, user_data)
+        prompt = self._render_prompt(cluster_info, user_data, products, deadline_str)
+        
+        return prompt, products, deadline_str
+    
+    def _deadline_str(self) -> str:
         # Calcular fecha límite (1 mes desde hoy)
         deadline = datetime.now() + timedelta(days=30)
-        deadline_str = deadline.strftime("%Y-%m-%d")
-        
+        return deadline.strftime("%Y-%m-%d")
+    
+    def _select_products(self, cluster_info: Dict, user_data: Dict):
+        """
+        Regresa (cluster_id, tipo de producto, productos) que se usarán para el reto
+        """
         # Obtener productos sugeridos para el cluster
         cluster_id = self._get_cluster_id_from_info(cluster_info)
-        cluster_products = self.cluster_products.get(cluster_id, self.cluster_products[0])
+        if cluster_id not in self.cluster_products:
+            cluster_id = 0
+        cluster_products = self.cluster_products[cluster_id]
         
         # Obtener la categoría más frecuente del usuario
         categoria_frecuente = user_data.get('categoria_mas_frecuente', 'COLAS')
         product_type = self.category_to_product_type.get(categoria_frecuente, 'bebidas_gaseosas')
         
         # Obtener productos específicos para esa categoría
-        products = cluster_products.get(product_type, list(cluster_products.values())[0])
+        if product_type not in cluster_products:
+            product_type = list(cluster_products.keys())[0]
         
+        return cluster_id, product_type, cluster_products[product_type]
+    
+    def _render_prompt(self, cluster_info: Dict, user_data: Dict, products: Dict, deadline_str: str) -> str:
         # Crear prompt para Gemini
         prompt = f"""
             Eres un experto en estrategias comerciales para tiendas de abarrotes.
@@ -203,20 +628,69 @@ class GeminiService:
 
         """
         
-        try:
-            response = self.model.generate_content(prompt)
-            challenge_json = json.loads(response.text.strip())
-            
-            # Agregar imagen del producto
-            challenge_json["imagen_producto"] = products["imagenes"][0]
-            challenge_json["productos_sugeridos"] = products["productos"]
-            challenge_json["imagenes_productos"] = products["imagenes"]
-            
-            return challenge_json
-            
-        except Exception as e:
-            # Fallback challenge si falla Gemini
-            return self._generate_fallback_challenge(cluster_info, user_data, products, deadline_str)
+        return prompt
+    
+    def _render_batch_prompt(self, stores: List[Tuple[Dict, Dict]], products: List[Dict], deadline_str: str) -> str:
+        # Contexto de cada tienda, numerado para que la respuesta conserve el orden
+        tiendas = []
+        for i, ((cluster_info, user_data), store_products) in enumerate(zip(stores, products), start=1):
+            tiendas.append(f"""
+            TIENDA {i}:
+            - Cluster: {cluster_info['name']}
+            - Descripción: {cluster_info['description']}
+            - Recomendación: {cluster_info['recommendation']}
+            - Categoría más frecuente: {user_data.get('categoria_mas_frecuente', 'COLAS')}
+            - Productos distintos promedio: {user_data.get('promedio_productos_distintos', 0)}
+            - Meses activos: {user_data.get('meses_activos', 0)}
+            - Porcentaje top 1: {user_data.get('promedio_porcentaje_top1', 0)}
+            - Productos sugeridos: {', '.join(store_products['productos'])}""")
+        
+        prompt = f"""
+            Eres un experto en estrategias comerciales para tiendas de abarrotes.
+
+            Genera {len(stores)} retos de lealtad, uno por cada tienda:
+            {''.join(tiendas)}
+
+            INSTRUCCIONES:
+            1. Cada reto debe ser claro, específico y motivador, alineado con el cluster y las métricas de su tienda.
+            2. La meta debe incluir una cantidad numérica concreta y alcanzable usando uno de los productos sugeridos de la tienda.
+            3. El sistema de recompensa es siempre a través de puntos canjeables por productos; detalla el incentivo (ejemplo: "gana 100 puntos").
+            4. Todos los retos son válidos desde el día 1 hasta el {deadline_str}.
+            5. El tono debe ser motivador pero realista.
+
+            FORMATO DE RESPUESTA (ARREGLO JSON con {len(stores)} elementos, en el orden de las tiendas):
+            [
+                {{
+                    "indice": número_de_tienda,
+                    "titulo": "Título atractivo del reto",
+                    "descripcion": "Descripción clara del reto, especificando la meta, producto y recompensa en puntos",
+                    "meta_numerica": número_objetivo,
+                    "unidad_medida": "unidades/litros/cajas/etc",
+                    "producto_objetivo": "nombre del producto",
+                    "incentivo": "qué gana al completar el reto (puntos canjeables por productos)",
+                    "fecha_limite": "{deadline_str}",
+                    "tips": ["tip 1", "tip 2", "tip 3"]
+                }}
+            ]
+
+            Responde SOLO con el arreglo JSON, sin texto adicional.
+
+        """
+        
+        return prompt
+    
+    def _parse_challenge(self, text: str, products: Dict) -> Dict[str, Any]:
+        """
+        Convierte la respuesta de Gemini en el reto y le agrega las imágenes del producto
+        """
+        challenge_json = json.loads(text.strip())
+        
+        # Agregar imagen del producto
+        challenge_json["imagen_producto"] = products["imagenes"][0]
+        challenge_json["productos_sugeridos"] = products["productos"]
+        challenge_json["imagenes_productos"] = products["imagenes"]
+        
+        return challenge_json
     
     def _get_cluster_id_from_info(self, cluster_info: Dict) -> int:
         """
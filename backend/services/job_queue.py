@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Cola de trabajos en segundo plano persistida en Mongo.
+
+    Cada trabajo es un documento {_id, payload, status, attempts, next_run_at};
+    los workers del proceso toman el siguiente trabajo vencido con
+    find_one_and_update, así que varios procesos pueden compartir la cola y
+    los trabajos sobreviven a un reinicio. Si el handler falla se reintenta con
+    backoff exponencial (con jitter) hasta max_attempts; un trabajo que quedó en
+    running más de lock_timeout segundos (p. ej. por un reinicio) se vuelve a tomar.
+    """
+
+    def __init__(self, collection_getter, collection_name: str, handler: Callable[[Dict[str, Any]], Awaitable[None]],
+                 workers: int = 2, max_attempts: int = 8, base_delay: float = 2.0, max_delay: float = 300.0,
+                 lock_timeout: float = 120.0, poll_interval: float = 5.0):
+        self._collection_getter = collection_getter
+        self.collection_name = collection_name
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._indexes_ready = False
+
+    @property
+    def collection(self):
+        return self._collection_getter(self.collection_name)
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any]) -> bool:
+        """
+        Agrega el trabajo si no existe (el _id lo hace idempotente) o lo vuelve a poner
+        en pending si había quedado en failed; regresa True si quedó encolado
+        """
+        self.start()
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": job_id},
+            {"$setOnInsert": {
+                "payload": payload,
+                "status": PENDING,
+                "attempts": 0,
+                "next_run_at": now,
+                "created_at": now
+            }},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            # Un trabajo que agotó sus intentos empieza de nuevo; uno pendiente o hecho se deja igual
+            requeued = await self.collection.update_one(
+                {"_id": job_id, "status": FAILED},
+                {
+                    "$set": {"payload": payload, "status": PENDING, "attempts": 0, "next_run_at": now},
+                    "$unset": {"finished_at": ""}
+                }
+            )
+            if requeued.modified_count == 0:
+                return False
+        self._wakeup.set()
+        return True
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "next_run_at": {"$lte": now}},
+                {"status": RUNNING, "locked_until": {"$lte": now}}
+            ]},
+            {
+                "$set": {"status": RUNNING, "locked_until": now + timedelta(seconds=self.lock_timeout)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def run_once(self) -> bool:
+        """
+        Ejecuta el siguiente trabajo vencido; regresa False si no había ninguno
+        """
+        job = await self._claim()
+        if job is None:
+            return False
+
+        try:
+            await self.handler(job["payload"])
+        except Exception as e:
+            attempts = job["attempts"]
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                logger.error(f"El trabajo {job['_id']} falló {attempts} veces, se abandona: {e}")
+                update = {"status": FAILED, "last_error": str(e), "finished_at": datetime.utcnow()}
+            else:
+                self.retried += 1
+                delay = self.backoff(attempts)
+                logger.warning(f"El trabajo {job['_id']} falló (intento {attempts}), se reintenta en {delay:.1f}s: {e}")
+                update = {
+                    "status": PENDING,
+                    "last_error": str(e),
+                    "next_run_at": datetime.utcnow() + timedelta(seconds=delay)
+                }
+            await self.collection.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+            return True
+
+        self.succeeded += 1
+        await self.collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": DONE, "finished_at": datetime.utcnow()}, "$unset": {"locked_until": ""}}
+        )
+        return True
+
+    async def _worker(self):
+        while True:
+            # Se limpia antes de buscar para no perder un enqueue que llegue mientras tanto
+            self._wakeup.clear()
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error en la cola de trabajos {self.collection_name}: {e}")
+
+            # Sin trabajos vencidos: esperar a uno nuevo o al siguiente sondeo (reintentos programados)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _ensure_indexes(self):
+        try:
+            await self.collection.create_index(
+                [("status", ASCENDING), ("next_run_at", ASCENDING)], name="status_next_run_at"
+            )
+            self._indexes_ready = True
+        except Exception as e:
+            logger.warning(f"No se pudieron crear los índices de {self.collection_name}: {e}")
+
+    def start(self):
+        """
+        Arranca los workers en el event loop actual; se llama sola en el primer enqueue
+        """
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if not self._indexes_ready:
+            self._tasks.append(loop.create_task(self._ensure_indexes()))
+        self._tasks.extend(loop.create_task(self._worker()) for _ in range(self.workers))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed
+        }
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+
+class LLMProvider(ABC):
+    """
+    Interfaz de los backends de LLM que usa GeminiService: reciben el prompt
+    y regresan el texto de la respuesta
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        ...
+
+    @abstractmethod
+    def generate_sync(self, prompt: str) -> str:
+        ...
+
+
+def prompt_hash(prompt: str) -> str:
+    """
+    Hash del prompt con los espacios colapsados y las fechas enmascaradas, usado
+    como llave de grabación (así una grabación sigue sirviendo en otro día)
+    """
+    normalized = re.sub(r"\d{4}-\d{2}-\d{2}", "YYYY-MM-DD", prompt)
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Backend real: google.generativeai
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = 'gemini-pro'):
+        import google.generativeai as genai
+
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    def generate_sync(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+
+class FakeProvider(LLMProvider):
+    """
+    Backend local determinista para pruebas de carga.
+
+    La latencia se toma de una distribución (constant, uniform, exponential o
+    lognormal) con media latency_ms y dispersión jitter_ms, y cada llamada falla
+    con probabilidad error_rate. Con la misma semilla y el mismo orden de llamadas
+    se obtienen siempre las mismas latencias, errores y respuestas.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 distribution: str = "constant", error_rate: float = 0.0, seed: int = 0):
+        if distribution not in ("constant", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Distribución de latencia desconocida: {distribution}")
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_latency(self) -> float:
+        mean = self.latency_ms
+        if self.distribution == "uniform":
+            value = self._rng.uniform(mean - self.jitter_ms, mean + self.jitter_ms)
+        elif self.distribution == "exponential":
+            value = self._rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        elif self.distribution == "lognormal":
+            if mean > 0:
+                sigma = self.jitter_ms / mean if self.jitter_ms else 0.5
+                value = self._rng.lognormvariate(0.0, sigma) * mean / math.exp(sigma ** 2 / 2)
+            else:
+                value = 0.0
+        else:
+            value = mean
+        return max(value, 0.0) / 1000
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self._next_latency(), self._rng.random() < self.error_rate
+
+    def _challenge(self, seed: str, producto: str, fecha: str) -> Dict:
+        digest = int(hashlib.sha256(seed.encode("utf-8")).hexdigest()[:8], 16)
+        meta = 10 + digest % 41
+        puntos = 50 + (digest // 41 % 10) * 10
+
+        return {
+            "titulo": f"¡Reto {producto}!",
+            "descripcion": f"Vende {meta} unidades de {producto} y gana {puntos} puntos",
+            "meta_numerica": meta,
+            "unidad_medida": "unidades",
+            "producto_objetivo": producto,
+            "incentivo": f"Gana {puntos} puntos canjeables por productos",
+            "fecha_limite": fecha,
+            "tips": ["Exhibe el producto en un lugar visible", "Ofrece combos", "Mantén stock constante"]
+        }
+
+    def _response(self, prompt: str) -> str:
+        seed = prompt_hash(prompt)
+        fecha = re.search(r'"fecha_limite":\s*"([^"]+)"', prompt)
+        fecha = fecha.group(1) if fecha else ""
+
+        # Prompt por lotes: un arreglo con un reto por tienda
+        if re.search(r"Genera \d+ retos", prompt):
+            productos = re.findall(r"Productos sugeridos:\s*(.+)", prompt)
+            return json.dumps([
+                dict(indice=i, **self._challenge(f"{seed}:{i}", lista.split(",")[0].strip(), fecha))
+                for i, lista in enumerate(productos, start=1)
+            ], ensure_ascii=False)
+
+        productos = re.search(r"PRODUCTOS SUGERIDOS:\s*(.+)", prompt)
+        producto = productos.group(1).split(",")[0].strip() if productos else "Producto"
+        return json.dumps(self._challenge(seed, producto, fecha), ensure_ascii=False)
+
+    async def generate(self, prompt: str) -> str:
+        latency, fails = self._draw()
+        await asyncio.sleep(latency)
+        if fails:
+            raise RuntimeError("Error simulado del proveedor LLM")
+        return self._response(prompt)
+
+    def generate_sync(self, prompt: str) -> str:
+        latency, fails = self._draw()
+        time.sleep(latency)
+        if fails:
+            raise RuntimeError("Error simulado del proveedor LLM")
+        return self._response(prompt)
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Backend local que sirve respuestas grabadas en un archivo JSONL
+    ({"prompt_hash": ..., "response": ...} por línea, ver RecordingProvider).
+
+    Si el prompt no está grabado lanza KeyError, o con strict=False regresa
+    las respuestas grabadas en rotación.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, strict: bool = True):
+        self.path = path
+        self.strict = strict
+        self.misses = 0
+        self._responses: Dict[str, str] = {}
+        self._ordered: List[str] = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._responses[record["prompt_hash"]] = record["response"]
+                self._ordered.append(record["response"])
+
+    def _lookup(self, prompt: str) -> str:
+        response = self._responses.get(prompt_hash(prompt))
+        if response is not None:
+            return response
+
+        with self._lock:
+            self.misses += 1
+            if self.strict or not self._ordered:
+                raise KeyError("Prompt sin respuesta grabada")
+            response = self._ordered[self._next % len(self._ordered)]
+            self._next += 1
+            return response
+
+    async def generate(self, prompt: str) -> str:
+        return self._lookup(prompt)
+
+    def generate_sync(self, prompt: str) -> str:
+        return self._lookup(prompt)
+
+
+class RecordingProvider(LLMProvider):
+    """
+    Envuelve otro backend y agrega cada respuesta al archivo JSONL que lee ReplayProvider
+    """
+
+    def __init__(self, inner: LLMProvider, path: str):
+        self.inner = inner
+        self.path = path
+        self.name = f"{inner.name}+record"
+        self._lock = threading.Lock()
+
+    def _record(self, prompt: str, response: str):
+        line = json.dumps({"prompt_hash": prompt_hash(prompt), "response": response}, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.inner.generate(prompt)
+        self._record(prompt, response)
+        return response
+
+    def generate_sync(self, prompt: str) -> str:
+        response = self.inner.generate_sync(prompt)
+        self._record(prompt, response)
+        return response
+
+
+def create_provider(kind: Optional[str] = None) -> LLMProvider:
+    """
+    Crea el backend indicado por LLM_PROVIDER (gemini, fake o replay).
+    Con LLM_RECORD_PATH las respuestas se graban para usarlas después con replay.
+    """
+    kind = (kind or os.getenv('LLM_PROVIDER', 'gemini')).lower()
+
+    if kind == "gemini":
+        provider = GeminiProvider(os.getenv('GEMINI_MODEL', 'gemini-pro'))
+    elif kind == "fake":
+        provider = FakeProvider(
+            latency_ms=float(os.getenv('LLM_FAKE_LATENCY_MS', '0')),
+            jitter_ms=float(os.getenv('LLM_FAKE_JITTER_MS', '0')),
+            distribution=os.getenv('LLM_FAKE_LATENCY_DIST', 'constant'),
+            error_rate=float(os.getenv('LLM_FAKE_ERROR_RATE', '0')),
+            seed=int(os.getenv('LLM_FAKE_SEED', '0'))
+        )
+    elif kind == "replay":
+        path = os.getenv('LLM_REPLAY_PATH')
+        if not path:
+            raise ValueError("LLM_REPLAY_PATH not found. Please check your .env file.")
+        provider = ReplayProvider(path, strict=os.getenv('LLM_REPLAY_STRICT', 'true').lower() in ('1', 'true', 'yes'))
+    else:
+        raise ValueError(f"LLM_PROVIDER desconocido: {kind}")
+
+    record_path = os.getenv('LLM_RECORD_PATH')
+    if record_path and kind != "replay":
+        provider = RecordingProvider(provider, record_path)
+
+    return provider
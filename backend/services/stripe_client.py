@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+
+class StripeClient(ABC):
+    """
+    Interfaz de lo que la app necesita de Stripe: crear el cliente (customer)
+    donde se guardarán los métodos de pago
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def create_customer(self, email: str, name: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        ...
+
+
+class StripeAPIClient(StripeClient):
+    """
+    Backend real: la librería stripe, llamada en un hilo para no bloquear el event loop
+    """
+
+    name = "stripe"
+
+    def __init__(self, api_key: Optional[str] = None):
+        import stripe
+
+        self._stripe = stripe
+        if api_key:
+            stripe.api_key = api_key
+
+    async def create_customer(self, email: str, name: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        # Con la misma idempotency_key Stripe regresa el mismo cliente si un reintento ya lo había creado
+        return await asyncio.to_thread(
+            self._stripe.Customer.create, email=email, name=name, idempotency_key=idempotency_key
+        )
+
+
+class FakeStripeClient(StripeClient):
+    """
+    Backend local para pruebas: latencia fija, tasa de error con semilla y
+    fail_first fallas iniciales; respeta idempotency_key como Stripe
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, fail_first: int = 0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.calls = 0
+        self.customers: Dict[str, Dict[str, Any]] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    async def create_customer(self, email: str, name: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            fails = self.calls <= self.fail_first or self._rng.random() < self.error_rate
+        await asyncio.sleep(self.latency_ms / 1000)
+        if fails:
+            raise RuntimeError("Error simulado de Stripe")
+
+        key = idempotency_key or f"{email}:{len(self.customers)}"
+        if key not in self.customers:
+            digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:14]
+            self.customers[key] = {"id": f"cus_{digest}", "object": "customer", "email": email, "name": name}
+        return self.customers[key]
+
+
+def create_stripe_client(kind: Optional[str] = None) -> StripeClient:
+    """
+    Crea el backend indicado por STRIPE_PROVIDER (stripe o fake)
+    """
+    kind = (kind or os.getenv('STRIPE_PROVIDER', 'stripe')).lower()
+
+    if kind == "stripe":
+        return StripeAPIClient(os.getenv('STRIPE_SECRET_KEY'))
+    if kind == "fake":
+        return FakeStripeClient(
+            latency_ms=float(os.getenv('STRIPE_FAKE_LATENCY_MS', '0')),
+            error_rate=float(os.getenv('STRIPE_FAKE_ERROR_RATE', '0')),
+            seed=int(os.getenv('STRIPE_FAKE_SEED', '0'))
+        )
+    raise ValueError(f"STRIPE_PROVIDER desconocido: {kind}")
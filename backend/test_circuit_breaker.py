@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB", "hack4her_test")
+
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from services.gemini_service import GeminiService
+from services.llm_providers import FakeProvider
+
+
+def make_breaker(**kwargs):
+    options = {"error_rate_threshold": 0.5, "p95_latency_threshold": 1.0, "window_size": 10, "min_calls": 4,
+               "cooldown": 30.0, **kwargs}
+    return CircuitBreaker("prueba", **options)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_calls):
+        assert breaker.allow_request()
+        breaker.record_failure(0.1)
+    assert breaker.state == OPEN
+
+
+def expire_cooldown(breaker):
+    breaker.opened_at -= breaker.cooldown
+
+
+def test_opens_on_error_rate():
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    breaker.record_success(0.1)
+    # Con menos de min_calls no se evalúa
+    assert breaker.state == CLOSED
+
+    breaker.record_failure(0.1)
+
+    assert breaker.state == OPEN
+    assert breaker.last_trip_reason == "tasa de error 50%"
+    assert not breaker.allow_request()
+    assert breaker.rejected == 1
+
+
+def test_opens_on_p95_latency():
+    breaker = make_breaker()
+    for latency in (0.1, 0.2, 0.3):
+        breaker.record_success(latency)
+    assert breaker.state == CLOSED
+
+    breaker.record_success(2.5)
+
+    assert breaker.state == OPEN
+    assert breaker.last_trip_reason == "p95 de latencia 2500 ms"
+
+
+def test_moves_to_half_open_after_cooldown():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    assert not breaker.allow_request()
+
+    expire_cooldown(breaker)
+
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Solo una prueba a la vez
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes_the_circuit():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    expire_cooldown(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_success(0.1)
+
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    expire_cooldown(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_failure(0.1)
+
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    assert breaker.last_trip_reason == "falló la llamada de prueba"
+    assert not breaker.allow_request()
+
+
+def test_cancelled_probe_releases_its_slot():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    expire_cooldown(breaker)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_cancelled()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_local_queueing_does_not_open_the_gemini_breaker():
+    service = GeminiService()
+    service.provider = FakeProvider(latency_ms=40)
+    service.timeout = 0.1
+    service.circuit_breaker = make_breaker(p95_latency_threshold=0.08)
+
+    async def burst():
+        # Un solo lugar en el semáforo: la mayoría espera y se descarta por el plazo
+        service._semaphore = asyncio.Semaphore(1)
+        return await asyncio.gather(
+            *(service._generate_text_async(f"prompt {n}") for n in range(20)),
+            return_exceptions=True
+        )
+
+    outcomes = asyncio.run(burst())
+
+    timeouts = [outcome for outcome in outcomes if isinstance(outcome, asyncio.TimeoutError)]
+    assert len(timeouts) == service.load_shed + service.timeouts
+    # Solo llegan al breaker las llamadas que sí obtuvieron lugar en el semáforo
+    assert service.load_shed >= 15
+    assert service.circuit_breaker.snapshot()["window_calls"] == 20 - service.load_shed
+    assert service.circuit_breaker.state == CLOSED
+    assert service.circuit_breaker.snapshot()["p95_ms"] < 80
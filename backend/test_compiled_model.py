@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import load
+
+from ml.compiled_model import CompiledModel, exportar_modelo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def cargar_pipeline():
+    preprocessor = load(os.path.join(BASE_DIR, "preprocessor.pkl"))
+    kmeans = load(os.path.join(BASE_DIR, "kmeans_model.pkl"))
+    return preprocessor, kmeans
+
+
+def generar_clientes(preprocessor, n=5000, seed=42):
+    """
+    Genera clientes alrededor de la distribución de entrenamiento guardada en el
+    StandardScaler (el CSV de entrenamiento no vive en el repo)
+    """
+    rng = np.random.default_rng(seed)
+    scaler = preprocessor.named_transformers_['num']
+    categorias = list(preprocessor.named_transformers_['cat'].categories_[0]) + ['DESCONOCIDA']
+
+    muestras = rng.normal(scaler.mean_, scaler.scale_ * 1.5, size=(n, len(scaler.mean_)))
+    clientes = []
+    for fila in muestras:
+        clientes.append({
+            'ticket_promedio': float(np.expm1(max(fila[0], 0))),
+            'frecuencia_compra': float(np.expm1(max(fila[1], 0))),
+            'variabilidad': float(np.expm1(max(fila[2], 0))),
+            'meses_activo': int(max(round(fila[3]), 1)),
+            'recencia': int(max(round(fila[4]), 0)),
+            'dist_hospital_m': float(abs(fila[5])),
+            'dist_escuela_m': float(abs(fila[6])),
+            'dist_gimnasio_m': float(abs(fila[7])),
+            'dist_oficina_m': float(abs(fila[8])),
+            'categoria_mas_frecuente': str(rng.choice(categorias)),
+        })
+    return clientes
+
+
+def predecir_sklearn(preprocessor, kmeans, clientes):
+    df = pd.DataFrame.from_records(clientes)
+    for columna in ['ticket_promedio', 'frecuencia_compra', 'variabilidad']:
+        df[f'{columna}_log'] = np.log1p(df[columna])
+    return kmeans.predict(preprocessor.transform(df)).tolist()
+
+
+def test_paridad_con_sklearn():
+    preprocessor, kmeans = cargar_pipeline()
+    compiled = exportar_modelo(preprocessor, kmeans)
+    clientes = generar_clientes(preprocessor)
+
+    esperado = predecir_sklearn(preprocessor, kmeans, clientes)
+
+    assert compiled.predecir_lote(clientes) == esperado
+    assert [compiled.predecir(cliente) for cliente in clientes[:500]] == esperado[:500]
+
+
+def test_guardar_y_cargar(tmp_path):
+    preprocessor, kmeans = cargar_pipeline()
+    compiled = exportar_modelo(preprocessor, kmeans)
+    path = str(tmp_path / "cyrce_compilado.npz")
+
+    compiled.guardar(path)
+    cargado = CompiledModel.cargar(path)
+
+    clientes = generar_clientes(preprocessor, n=200, seed=7)
+    assert cargado.predecir_lote(clientes) == compiled.predecir_lote(clientes)
+
+
+@pytest.mark.parametrize("campo, valor", [
+    ("ticket_promedio", -5.0),
+    ("frecuencia_compra", -1.0),
+    ("dist_hospital_m", float("inf")),
+    ("dist_escuela_m", float("nan")),
+])
+def test_valores_no_finitos_se_rechazan_como_en_sklearn(campo, valor):
+    preprocessor, kmeans = cargar_pipeline()
+    compiled = exportar_modelo(preprocessor, kmeans)
+    clientes = generar_clientes(preprocessor, n=3, seed=3)
+    clientes[1][campo] = valor
+
+    with pytest.raises(ValueError):
+        predecir_sklearn(preprocessor, kmeans, clientes)
+    with pytest.raises(ValueError):
+        compiled.predecir_lote(clientes)
+    with pytest.raises(ValueError):
+        compiled.predecir(clientes[1])
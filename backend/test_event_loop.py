@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB", "hack4her_test")
+
+import httpx
+from bson import ObjectId
+
+import llms.router as router
+from main import app
+from services.gemini_service import gemini_service
+from services.llm_providers import FakeProvider
+
+STORE_DATA = {
+    "ticket_promedio": 12.50,
+    "frecuencia_compra": 8.0,
+    "variabilidad": 3.2,
+    "recencia": 1,
+    "meses_activo": 20,
+    "dist_hospital_m": 1200.0,
+    "dist_escuela_m": 500.0,
+    "dist_gimnasio_m": 3000.0,
+    "dist_oficina_m": 6000.0,
+    "categoria_mas_frecuente": "COLAS"
+}
+
+LLM_DELAY = 1.0
+
+
+class FakeInsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+class FakeCollection:
+    """
+    Colección en memoria con la misma interfaz asíncrona que Motor
+    """
+
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, document):
+        document.setdefault("_id", ObjectId())
+        self.docs[document["_id"]] = document
+        return FakeInsertResult(document["_id"])
+
+    async def find_one(self, query, *args, **kwargs):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(str(query["_id"]), {"_id": query["_id"]})
+
+    def find(self, query, *args, **kwargs):
+        return FakeCursor([doc for doc in self.docs.values() if all(doc.get(k) == v for k, v in query.items())])
+
+
+def test_challenge_status_not_blocked_by_slow_llm(monkeypatch):
+    collection = FakeCollection()
+    existing_id = ObjectId()
+    collection.docs[existing_id] = {
+        "_id": existing_id,
+        "cluster_id": 1,
+        "cluster_info": {"name": "Cluster 1"},
+        "challenge": {"titulo": "Reto"},
+        "challenge_completed": False,
+        "progress_updates": [],
+        "timestamp": "2025-01-01T00:00:00"
+    }
+
+    monkeypatch.setattr(router.challenge_repository, "_collection_getter", lambda name: collection)
+    events = FakeCollection()
+    monkeypatch.setattr(router.progress_events, "_collection_getter", lambda name: events)
+    rollups = FakeCollection()
+    monkeypatch.setattr(router.challenge_rollups, "_collection_getter", lambda name: rollups)
+    monkeypatch.setattr(gemini_service, "provider", FakeProvider(latency_ms=LLM_DELAY * 1000))
+    monkeypatch.setattr(gemini_service.challenge_cache, "max_variants", 0)
+    monkeypatch.setattr(gemini_service.challenge_pool, "enabled", False)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            store_task = asyncio.create_task(client.post("/store", json=STORE_DATA))
+            # Dar tiempo a que /store llegue a la llamada del LLM
+            await asyncio.sleep(0.1)
+
+            start = time.perf_counter()
+            status = await client.get(f"/challenge/{existing_id}")
+            elapsed = time.perf_counter() - start
+
+            assert not store_task.done()
+            store_response = await store_task
+            return status, elapsed, store_response
+
+    status, elapsed, store_response = asyncio.run(scenario())
+
+    assert status.status_code == 200
+    assert elapsed < LLM_DELAY / 4
+    assert store_response.status_code == 200
+    assert store_response.json()["challenge"]["meta_numerica"] >= 10
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+
+from auth.google_certs import GoogleCertCache
+
+AUDIENCE = "test-client.apps.googleusercontent.com"
+MAX_AGE = 120
+
+
+def make_key(key_id):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return crypt.RSASigner.from_string(private_pem, key_id=key_id), public_pem.decode()
+
+
+class KeyServer:
+    """
+    Servidor local que hace las veces del endpoint de certificados de Google
+    """
+
+    def __init__(self, certs):
+        self.certs = certs
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.certs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, must-revalidate")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/certs"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def key_server():
+    signer, public_pem = make_key("key-1")
+    server = KeyServer({"key-1": public_pem})
+    server.signer = signer
+    yield server
+    server.close()
+
+
+def id_token(signer, **claims):
+    now = int(time.time())
+    payload = {"iss": "https://accounts.google.com", "aud": AUDIENCE, "iat": now, "exp": now + 300,
+               "email": "tienda@example.com", **claims}
+    return google_jwt.encode(signer, payload).decode()
+
+
+def test_login_burst_fetches_certs_once(key_server):
+    cache = GoogleCertCache(key_server.url)
+    tokens = [id_token(key_server.signer, sub=str(i)) for i in range(50)]
+
+    async def burst():
+        return await asyncio.gather(*(cache.verify(token, AUDIENCE) for token in tokens))
+
+    claims = asyncio.run(burst())
+
+    assert [c["sub"] for c in claims] == [str(i) for i in range(50)]
+    assert key_server.requests == 1
+    assert cache._expires_at - time.monotonic() > MAX_AGE - 5
+
+
+def test_rotated_key_triggers_refetch(key_server):
+    cache = GoogleCertCache(key_server.url, min_refetch_interval=0)
+    asyncio.run(cache.verify(id_token(key_server.signer), AUDIENCE))
+
+    new_signer, new_public_pem = make_key("key-2")
+    key_server.certs = {"key-2": new_public_pem}
+    claims = asyncio.run(cache.verify(id_token(new_signer), AUDIENCE))
+
+    assert claims["email"] == "tienda@example.com"
+    assert key_server.requests == 2
+
+
+def test_rejects_wrong_audience(key_server):
+    cache = GoogleCertCache(key_server.url)
+    with pytest.raises(ValueError):
+        asyncio.run(cache.verify(id_token(key_server.signer, aud="otro-cliente"), AUDIENCE))
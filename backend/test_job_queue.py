@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from services.job_queue import DONE, FAILED, JobQueue
+from services.stripe_client import FakeStripeClient
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_queue(handler, **kwargs):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    options = {"base_delay": 0.01, "max_delay": 0.05, "poll_interval": 0.01, **kwargs}
+    return db.stripe_jobs, JobQueue(lambda name: db[name], "stripe_jobs", handler=handler, **options)
+
+
+def test_stripe_job_retries_until_it_succeeds():
+    stripe = FakeStripeClient(fail_first=2)
+    created = []
+
+    async def provision(payload):
+        customer = await stripe.create_customer(payload["email"], payload["name"], idempotency_key=payload["user_id"])
+        created.append(customer["id"])
+
+    collection, queue = make_queue(provision)
+
+    async def scenario():
+        assert await queue.enqueue("stripe-customer:1", {"user_id": "1", "email": "a@example.com", "name": "A"})
+        # El mismo trabajo no se encola dos veces
+        assert not await queue.enqueue("stripe-customer:1", {"user_id": "1", "email": "a@example.com", "name": "A"})
+        for _ in range(200):
+            job = await collection.find_one({"_id": "stripe-customer:1"})
+            if job["status"] == DONE:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job["status"] == DONE
+    assert job["attempts"] == 3
+    assert stripe.calls == 3
+    assert len(created) == 1
+    assert queue.stats()["retried"] == 2
+
+
+def test_job_fails_after_max_attempts():
+    async def always_fails(payload):
+        raise RuntimeError("Stripe caído")
+
+    collection, queue = make_queue(always_fails, max_attempts=3)
+
+    async def scenario():
+        await queue.enqueue("stripe-customer:2", {"user_id": "2"})
+        for _ in range(200):
+            job = await collection.find_one({"_id": "stripe-customer:2"})
+            if job["status"] == FAILED:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job["status"] == FAILED
+    assert job["attempts"] == 3
+    assert job["last_error"] == "Stripe caído"
+
+
+def test_failed_job_is_requeued_on_next_enqueue():
+    outcomes = [RuntimeError("Stripe caído"), None]
+
+    async def flaky(payload):
+        if outcomes.pop(0) is not None:
+            raise RuntimeError("Stripe caído")
+
+    collection, queue = make_queue(flaky, max_attempts=1)
+
+    async def wait_for(status):
+        for _ in range(200):
+            job = await collection.find_one({"_id": "stripe-customer:3"})
+            if job["status"] == status:
+                return job
+            await asyncio.sleep(0.01)
+        return job
+
+    async def scenario():
+        await queue.enqueue("stripe-customer:3", {"user_id": "3"})
+        failed = await wait_for(FAILED)
+        # El siguiente login lo vuelve a encolar con los intentos en cero
+        requeued = await queue.enqueue("stripe-customer:3", {"user_id": "3"})
+        done = await wait_for(DONE)
+        await queue.stop()
+        return failed, requeued, done
+
+    failed, requeued, done = asyncio.run(scenario())
+
+    assert failed["status"] == FAILED
+    assert requeued
+    assert done["status"] == DONE
+    assert done["attempts"] == 1
@@ -0,0 +1,85 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+from joblib import dump, load
+
+from ml.cyrce_model import ModelRegistry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def copiar_artefactos(tmp_path):
+    rutas = []
+    for nombre in ("preprocessor.pkl", "kmeans_model.pkl"):
+        destino = tmp_path / nombre
+        shutil.copy(os.path.join(BASE_DIR, nombre), destino)
+        rutas.append(str(destino))
+    return rutas
+
+
+def tocar(path):
+    """Fuerza un mtime distinto aunque el archivo se reescriba con el mismo tamaño"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_reemplazar_artefactos_recarga_el_modelo(tmp_path):
+    preprocessor_path, kmeans_path = copiar_artefactos(tmp_path)
+    registry = ModelRegistry(preprocessor_path, kmeans_path, check_interval=0)
+
+    original = registry.get()
+    assert original.version == 1
+    assert registry.get() is original
+
+    kmeans = load(kmeans_path)
+    kmeans.cluster_centers_ = np.roll(kmeans.cluster_centers_, 1, axis=0)
+    dump(kmeans, kmeans_path)
+    tocar(kmeans_path)
+
+    nuevo = registry.get()
+    assert nuevo.version == 2
+    assert nuevo is not original
+    np.testing.assert_array_equal(nuevo.kmeans.cluster_centers_, kmeans.cluster_centers_)
+    # El par viejo no se modifica; quien lo tenga en mano sigue viendo un par completo
+    assert not np.array_equal(original.kmeans.cluster_centers_, nuevo.kmeans.cluster_centers_)
+
+
+def test_artefacto_corrupto_conserva_la_version_vigente(tmp_path):
+    preprocessor_path, kmeans_path = copiar_artefactos(tmp_path)
+    registry = ModelRegistry(preprocessor_path, kmeans_path, check_interval=0)
+    original = registry.get()
+
+    with open(kmeans_path, "wb") as f:
+        f.write(b"no es un pickle")
+    assert registry.get() is original
+
+    os.remove(kmeans_path)
+    assert registry.get() is original
+
+    # En cuanto el artefacto vuelve a ser válido se carga como versión nueva
+    shutil.copy(os.path.join(BASE_DIR, "kmeans_model.pkl"), kmeans_path)
+    tocar(kmeans_path)
+    assert registry.get().version == 2
+
+
+def test_carga_inicial_corrupta_falla(tmp_path):
+    preprocessor_path, kmeans_path = copiar_artefactos(tmp_path)
+    with open(preprocessor_path, "wb") as f:
+        f.write(b"no es un pickle")
+
+    with pytest.raises(Exception):
+        ModelRegistry(preprocessor_path, kmeans_path, check_interval=0).get()
+
+
+def test_revision_respeta_el_intervalo(tmp_path):
+    preprocessor_path, kmeans_path = copiar_artefactos(tmp_path)
+    registry = ModelRegistry(preprocessor_path, kmeans_path, check_interval=3600)
+    original = registry.get()
+
+    tocar(kmeans_path)
+    assert registry.get() is original
+
+    registry._last_check -= 3600
+    assert registry.get().version == 2
@@ -0,0 +1,89 @@
+import os
+import shutil
+
+import numpy as np
+from joblib import dump, load
+
+from ml import cyrce_model
+from ml.cyrce_model import ModelRegistry
+from ml.prediction_cache import PredictionCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CLIENTE = {
+    'ticket_promedio': 12.50,
+    'frecuencia_compra': 8.0,
+    'variabilidad': 3.2,
+    'recencia': 1,
+    'meses_activo': 20,
+    'dist_hospital_m': 1200,
+    'dist_escuela_m': 500,
+    'dist_gimnasio_m': 3000,
+    'dist_oficina_m': 6000,
+    'categoria_mas_frecuente': 'COLAS',
+}
+
+
+def copiar_artefactos(tmp_path):
+    rutas = []
+    for nombre in ("preprocessor.pkl", "kmeans_model.pkl"):
+        destino = tmp_path / nombre
+        shutil.copy(os.path.join(BASE_DIR, nombre), destino)
+        rutas.append(str(destino))
+    return rutas
+
+
+def rotar_clusters(kmeans_path):
+    """
+    Reescribe el kmeans con los centros rotados una posición, así el cluster i pasa a
+    ser el (i + 1) % n, y fuerza un mtime distinto aunque el tamaño no cambie
+    """
+    kmeans = load(kmeans_path)
+    kmeans.cluster_centers_ = np.roll(kmeans.cluster_centers_, 1, axis=0)
+    dump(kmeans, kmeans_path)
+    stat = os.stat(kmeans_path)
+    os.utime(kmeans_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    return len(kmeans.cluster_centers_)
+
+
+def test_cambio_de_version_vacia_la_cache(tmp_path, monkeypatch):
+    preprocessor_path, kmeans_path = copiar_artefactos(tmp_path)
+    registry = ModelRegistry(preprocessor_path, kmeans_path, check_interval=0)
+    cache = PredictionCache(max_size=100, ttl=3600)
+    monkeypatch.setattr(cyrce_model, "model_registry", registry)
+    monkeypatch.setattr(cyrce_model, "prediction_cache", cache)
+
+    original = cyrce_model.predecir_cluster(**CLIENTE)
+    assert cyrce_model.predecir_cluster(**CLIENTE) == original
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["model_version"] == 1
+
+    n_clusters = rotar_clusters(kmeans_path)
+
+    # La entrada de la versión 1 ya no se sirve: se recalcula con el modelo nuevo
+    assert cyrce_model.predecir_cluster(**CLIENTE) == (original + 1) % n_clusters
+    stats = cache.stats()
+    assert stats["model_version"] == 2
+    assert stats["invalidations"] == 1
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 1)
+
+    assert cyrce_model.predecir_cluster(**CLIENTE) == (original + 1) % n_clusters
+    assert cache.stats()["hits"] == 2
+
+
+def test_cuantizacion_y_expiracion(monkeypatch):
+    cache = PredictionCache(max_size=100, ttl=60)
+    reloj = [1000.0]
+    monkeypatch.setattr("ml.prediction_cache.time.monotonic", lambda: reloj[0])
+
+    cache.put(1, CLIENTE, 3)
+    # Dentro del mismo paso de cuantización cae en la misma llave
+    assert cache.get(1, {**CLIENTE, 'dist_hospital_m': 1210}) == 3
+    assert cache.get(1, {**CLIENTE, 'dist_hospital_m': 1300}) is None
+
+    reloj[0] += 61
+    assert cache.get(1, CLIENTE) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 0)
+    assert stats["hit_rate"] == 1 / 3
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db.progress_events import ProgressEventStore, decode_cursor, encode_cursor
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_store(bucket_size=500):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    return ProgressEventStore(lambda name: db[name], "progress_events", bucket_size=bucket_size)
+
+
+def read_all(store, limit):
+    async def scenario():
+        pages = []
+        before = None
+        while True:
+            events, has_more = await store.page("reto", limit, before=before)
+            pages.append([event["n"] for _, event in events])
+            if not has_more:
+                return pages
+            before = decode_cursor(encode_cursor(events[0][0]))
+
+    return asyncio.run(scenario())
+
+
+def test_paging_does_not_skip_events_with_the_same_timestamp():
+    store = make_store()
+    timestamp = datetime(2024, 5, 1, 12, 0, 0)
+
+    async def fill():
+        for n in range(5):
+            await store.append("reto", {"n": n, "timestamp": timestamp})
+
+    asyncio.run(fill())
+
+    assert read_all(store, 2) == [[3, 4], [1, 2], [0]]
+
+
+def test_paging_across_full_buckets():
+    store = make_store(bucket_size=3)
+    start = datetime(2024, 5, 1, 12, 0, 0)
+
+    async def fill():
+        for n in range(8):
+            # Dos eventos por milisegundo, repartidos en buckets de 3
+            await store.append("reto", {"n": n, "timestamp": start + timedelta(milliseconds=n // 2)})
+
+    asyncio.run(fill())
+
+    assert read_all(store, 3) == [[5, 6, 7], [2, 3, 4], [0, 1]]
+
+
+def test_offset_timestamps_go_to_their_utc_day():
+    store = make_store()
+    local = timezone(timedelta(hours=-6))
+
+    async def fill():
+        # 23:00 en UTC-6 ya es el 2 de octubre en UTC, después del evento de las 04:00 UTC
+        await store.append("reto", {"n": 0, "timestamp": datetime(2026, 10, 2, 4, 0)})
+        await store.append("reto", {"n": 1, "timestamp": datetime(2026, 10, 1, 23, 0, tzinfo=local)})
+        return await store.collection.distinct("day")
+
+    days = asyncio.run(fill())
+
+    assert days == ["2026-10-02"]
+    assert read_all(store, 1) == [[1], [0]]
@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB", "hack4her_test")
+
+from services.gemini_service import GeminiService
+from services.llm_providers import FakeProvider
+
+CLUSTER_INFO = {"name": "Cluster 1", "description": "Cliente tipo 1", "recommendation": "Recomendación para cluster 1"}
+USER_DATA = {"categoria_mas_frecuente": "COLAS", "meses_activo": 20}
+
+
+def make_service():
+    service = GeminiService()
+    service.provider = FakeProvider(latency_ms=50)
+    service.challenge_cache.max_variants = 0
+    service.challenge_pool.enabled = False
+    return service
+
+
+def test_identical_prompts_share_one_upstream_call():
+    service = make_service()
+
+    async def burst():
+        return await asyncio.gather(*(
+            service.generate_challenge_async(CLUSTER_INFO, USER_DATA) for _ in range(10)
+        ))
+
+    challenges = asyncio.run(burst())
+
+    assert service.provider.calls == 1
+    assert service.upstream_calls == 1
+    assert service.coalesced_calls == 9
+    assert all(challenge == challenges[0] for challenge in challenges)
+    # Cada solicitante recibe su propia copia
+    challenges[0]["tips"].append("modificado")
+    assert "modificado" not in challenges[1]["tips"]
+    assert len({id(challenge) for challenge in challenges}) == 10
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    service = make_service()
+
+    async def scenario():
+        first = asyncio.ensure_future(service.generate_challenge_async(CLUSTER_INFO, USER_DATA))
+        second = asyncio.ensure_future(service.generate_challenge_async(CLUSTER_INFO, USER_DATA))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    challenge = asyncio.run(scenario())
+
+    assert challenge["titulo"]
+    assert service.provider.calls == 1
+    assert service.coalesced_calls == 1
+    assert service.circuit_breaker.state == "closed"
@@ -0,0 +1,39 @@
+from db.status_cache import ChallengeStatusCache, challenge_etag, etag_matches
+
+
+def test_put_is_dropped_when_invalidated_during_the_read():
+    cache = ChallengeStatusCache(max_size=10, ttl=300)
+
+    generation = cache.generation()
+    # Un progreso llega mientras el GET todavía está leyendo Mongo
+    cache.invalidate("reto")
+    cache.put("reto", '"reto-0-0"', {"progress_count": 0}, generation)
+    assert cache.get("reto") is None
+
+    generation = cache.generation()
+    cache.invalidate("otro")
+    cache.put("reto", '"reto-1-0"', {"progress_count": 1}, generation)
+    assert cache.get("reto") == ('"reto-1-0"', {"progress_count": 1})
+
+
+def test_forgotten_invalidations_are_treated_as_recent():
+    cache = ChallengeStatusCache(max_size=2, ttl=300)
+
+    generation = cache.generation()
+    for challenge_id in ("a", "b", "c"):
+        cache.invalidate(challenge_id)
+    # La invalidación de "a" ya se olvidó; no se sabe si fue antes o después de la lectura
+    cache.put("a", '"a-0-0"', {}, generation)
+    assert cache.get("a") is None
+
+    cache.put("a", '"a-1-0"', {}, cache.generation())
+    assert cache.get("a") is not None
+
+
+def test_version_projection_gives_the_same_etag():
+    full = {"progress_count": 3, "challenge_completed": True, "challenge": {"titulo": "Reto"}}
+    version = {"progress_count": 3, "challenge_completed": True}
+
+    etag = challenge_etag("reto", full, variant="progress_updates|5")
+    assert etag == challenge_etag("reto", version, variant="progress_updates|5")
+    assert etag_matches(f'W/{etag}, "otro"', etag)
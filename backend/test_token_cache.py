@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from auth import token_cache
+from auth.token_cache import RevocationList, UserCache
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_lists(count=1):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    # sync_interval alto: las pruebas sincronizan a mano
+    return [RevocationList(lambda name: db[name], "revoked_tokens", sync_interval=3600) for _ in range(count)]
+
+
+def test_issue_revokes_the_previous_token():
+    (revocations,) = make_lists()
+    exp = time.time() + 600
+
+    async def scenario():
+        await revocations.issue("user-1", "jti-1", exp)
+        first = revocations.is_revoked("jti-1")
+        await revocations.issue("user-1", "jti-2", exp)
+        # Volver a registrar el mismo token no lo revoca
+        await revocations.issue("user-1", "jti-2", exp)
+        return first, revocations.is_revoked("jti-1"), revocations.is_revoked("jti-2")
+
+    assert asyncio.run(scenario()) == (False, True, False)
+
+
+def test_revoke_then_is_revoked():
+    (revocations,) = make_lists()
+
+    async def scenario():
+        await revocations.revoke("jti-1", time.time() + 600)
+        await revocations.revoke("jti-vencido", time.time() - 1)
+        stored = await revocations.collection.find_one({"_id": "jti-1"})
+        return revocations.is_revoked("jti-1"), revocations.is_revoked("jti-vencido"), stored
+
+    revoked, expired, stored = asyncio.run(scenario())
+
+    assert revoked
+    # Un token que ya venció no necesita seguir en la lista
+    assert not expired
+    assert stored["revoked_at"] is not None
+
+
+def test_sync_picks_up_revocations_from_another_process():
+    local, other = make_lists(2)
+
+    async def scenario():
+        await local.sync()
+        await other.revoke("jti-1", time.time() + 600)
+        before = local.is_revoked("jti-1")
+        await local.sync()
+        after = local.is_revoked("jti-1")
+        await other.revoke("jti-2", time.time() + 600)
+        # La siguiente sincronización solo trae lo nuevo y conserva lo anterior
+        await local.sync()
+        return before, after, local.is_revoked("jti-1"), local.is_revoked("jti-2")
+
+    assert asyncio.run(scenario()) == (False, True, True, True)
+
+
+def test_user_cache_expires_with_the_token_or_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(token_cache.time, "time", lambda: now[0])
+    cache = UserCache(max_size=10, ttl=60)
+
+    cache.put("token-corto", "usuario-a", exp=1010.0)
+    cache.put("token-largo", "usuario-b", exp=5000.0)
+    assert cache.get("token-corto") == "usuario-a"
+    assert cache.get("token-largo") == "usuario-b"
+
+    now[0] = 1011.0
+    assert cache.get("token-corto") is None
+    assert cache.get("token-largo") == "usuario-b"
+
+    now[0] = 1061.0
+    assert cache.get("token-largo") is None
+    assert (cache.hits, cache.misses) == (3, 2)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from db.write_behind import WriteBehindBuffer
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_buffer(**kwargs):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    options = {"batch_size": 100, "flush_interval": 10.0, **kwargs}
+    return db.user_challenges, WriteBehindBuffer(lambda name: db[name], "user_challenges", **options)
+
+
+def test_full_batch_is_flushed_by_a_single_task():
+    collection, buffer = make_buffer(batch_size=5)
+    insert_many = collection.insert_many
+
+    async def slow_insert_many(documents, ordered=True):
+        await asyncio.sleep(0.02)
+        return await insert_many(documents, ordered=ordered)
+
+    buffer._collection_getter = lambda name: collection
+    collection.insert_many = slow_insert_many
+
+    async def scenario():
+        buffer.start()
+        tasks = 0
+        # Mientras un flush tiene el lock, los add no deben ir acumulando tareas
+        for n in range(60):
+            await buffer.add({"n": n})
+            tasks = max(tasks, len(asyncio.all_tasks()))
+            await asyncio.sleep(0.001)
+        await buffer.stop()
+        return tasks, await collection.count_documents({})
+
+    tasks, count = asyncio.run(scenario())
+
+    assert tasks <= 3
+    assert count == 60
+    assert buffer.stats()["pending"] == 0
+
+
+def test_partial_batch_is_flushed_on_the_interval():
+    collection, buffer = make_buffer(flush_interval=0.05)
+
+    async def scenario():
+        buffer.start()
+        await buffer.add({"n": 1})
+        before = await collection.count_documents({})
+        await asyncio.sleep(0.2)
+        after = await collection.count_documents({})
+        await buffer.stop()
+        return before, after
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_ids_are_assigned_before_the_insert():
+    collection, buffer = make_buffer()
+    own_id = ObjectId()
+
+    async def scenario():
+        buffer.start()
+        challenge_id = await buffer.add({"n": 1})
+        pending = buffer.get_pending(ObjectId(challenge_id))
+        assert await buffer.add({"_id": own_id, "n": 2}) == str(own_id)
+        await buffer.stop()
+        return challenge_id, pending, await collection.find_one({"_id": ObjectId(challenge_id)})
+
+    challenge_id, pending, stored = asyncio.run(scenario())
+
+    assert pending["n"] == 1
+    assert stored["n"] == 1
+    assert str(stored["_id"]) == challenge_id
+
+
+def test_stop_drains_pending_documents_after_a_failed_insert():
+    collection, buffer = make_buffer()
+    insert_many = collection.insert_many
+    calls = []
+
+    async def flaky_insert_many(documents, ordered=True):
+        calls.append(len(documents))
+        if len(calls) == 1:
+            raise ConnectionError("Mongo no disponible")
+        return await insert_many(documents, ordered=ordered)
+
+    buffer._collection_getter = lambda name: collection
+    collection.insert_many = flaky_insert_many
+
+    async def scenario():
+        buffer.start()
+        for n in range(7):
+            await buffer.add({"n": n})
+        await buffer.stop()
+        return await collection.count_documents({})
+
+    assert asyncio.run(scenario()) == 7
+    assert calls == [7, 7]
+    assert buffer.stats()["pending"] == 0